@@ -10,6 +10,7 @@ from gemini_task_tab import render_gemini_task_tab
 from gemini_json_import import render_json_import_tab
 from memory_tab import render_memory_tab
 from guide import render_guide_tab # <--- MỚI THÊM
+from gsheet import refresh_cache, get_syncing_sheets, get_pending_writes, get_failed_writes, discard_failed_write, retry_failed_write
 
 # =========================================================
 # ✅ CẤU HÌNH GIAO DIỆN
@@ -81,6 +82,30 @@ elif menu == "Nhập liệu từ JSON":
 elif menu == "Trí nhớ AI":
     render_memory_tab()
 
+# Nút làm mới dữ liệu thủ công (bỏ qua cache, đọc lại Google Sheet)
+st.sidebar.markdown("---")
+if st.sidebar.button("🔄 Tải lại dữ liệu từ Sheet"):
+    refresh_cache()
+    st.rerun()
+if get_syncing_sheets():
+    st.sidebar.caption("⏳ Đang hiển thị bản lưu tạm, đang đồng bộ với Google Sheet...")
+pending_count, pending_error = get_pending_writes()
+if pending_count:
+    st.sidebar.caption(f"🟡 {pending_count} thay đổi đang chờ đồng bộ lên Sheet...")
+if pending_error:
+    st.sidebar.warning(f"Ghi lỗi, sẽ tự thử lại: {pending_error}")
+# Lệnh ghi lỗi nhiều lần: không tự gửi nữa, người dùng chọn bỏ hoặc thử lại
+for i, failed in enumerate(get_failed_writes()):
+    st.sidebar.error(f"❌ Không ghi được {failed['count']} mục ({failed['kind']}) vào {failed['sheet']}: {failed['error']}")
+    col1, col2 = st.sidebar.columns(2)
+    if col1.button("🗑️ Bỏ thay đổi", key=f"failed_discard_{i}"):
+        discard_failed_write(i)
+        refresh_cache([failed["sheet"]])
+        st.rerun()
+    if col2.button("🔁 Thử lại", key=f"failed_retry_{i}"):
+        retry_failed_write(i)
+        st.rerun()
+
 # Thêm Footer nhỏ
 st.sidebar.markdown("---")
 st.sidebar.caption("Phiên bản: Cloud 1.2 | Dev: ThangNT")
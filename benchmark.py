@@ -0,0 +1,157 @@
+"""
+Đo nhanh tốc độ các hàm xử lý dữ liệu (không cần Google Sheet).
+Chạy: python benchmark.py
+"""
+import re
+import os
+import tempfile
+import timeit
+import pandas as pd
+
+import gsheet
+import task_search
+from config import REQUIRED_SHEETS
+from storage import SQLiteBackend
+from utils import normalize_columns, normalize_column_name, _normalized_header, format_date_vn, format_date_column
+from task_search import build_search_index, search_index, search_tasks
+
+
+# =========================================================
+# 🐢 CÁCH CŨ (để so sánh)
+# =========================================================
+def _legacy_normalize_column_name(col):
+    """Bản cũ: 10 lần re.sub cho mỗi tên cột."""
+    s = str(col).strip().upper()
+    s = re.sub(r'[ÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴ]', 'A', s)
+    s = re.sub(r'[ÈÉẸẺẼÊỀẾỆỂỄ]', 'E', s)
+    s = re.sub(r'[ÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠ]', 'O', s)
+    s = re.sub(r'[ÌÍỊỈĨ]', 'I', s)
+    s = re.sub(r'[ÙÚỤỦŨƯỪỨỰỬỮ]', 'U', s)
+    s = re.sub(r'[ỲÝỴỶỸ]', 'Y', s)
+    s = re.sub(r'[Đ]', 'D', s)
+    s = re.sub(r'[^A-Z0-9_]', '_', s)
+    s = re.sub(r'_+', '_', s)
+    return s.strip('_')
+
+
+def _report(title, legacy, new, number):
+    t_old = timeit.timeit(legacy, number=number)
+    t_new = timeit.timeit(new, number=number)
+    print(f"{title:<45} cũ {t_old * 1e6 / number:9.1f} µs | mới {t_new * 1e6 / number:9.1f} µs | x{t_old / t_new:5.1f}")
+
+
+# =========================================================
+# 🏷️ CHUẨN HÓA TÊN CỘT
+# =========================================================
+def bench_normalize_columns(number=2000):
+    # Tiêu đề giống 1 lần tải đủ các sheet (~25 cột có dấu mỗi sheet)
+    header = [f"Cột {i} - Người nhận / Hạn chót (đơn vị)" for i in range(25)]
+    frames = [pd.DataFrame([[""] * len(header)], columns=header) for _ in REQUIRED_SHEETS]
+
+    for col in header + ["Tên việc", "ĐƯỜNG  dây__nóng"]:
+        assert normalize_column_name(col) == _legacy_normalize_column_name(col), col
+
+    def legacy():
+        for df in frames:
+            df.columns = [_legacy_normalize_column_name(c) for c in header]
+
+    def new():
+        for df in frames:
+            df.columns = header
+            normalize_columns(df)
+
+    _report(f"normalize_columns ({len(frames)} sheet x {len(header)} cột)", legacy, new, number)
+    # Riêng bước tính tên mới (bỏ chi phí gán df.columns chung cho cả 2 cách)
+    _report(f"  - chỉ ánh xạ tiêu đề ({len(header)} cột)",
+            lambda: [_legacy_normalize_column_name(c) for c in header],
+            lambda: _normalized_header(tuple(header)), number)
+    _report("normalize_column_name (1 tên cột, chưa cache)",
+            lambda: _legacy_normalize_column_name(header[0]),
+            lambda: normalize_column_name.__wrapped__(header[0]), number * 10)
+    _report("normalize_column_name (1 tên cột, đã cache)",
+            lambda: _legacy_normalize_column_name(header[0]),
+            lambda: normalize_column_name(header[0]), number * 10)
+
+
+# =========================================================
+# 📅 ĐỊNH DẠNG CỘT NGÀY ĐỂ HIỂN THỊ
+# =========================================================
+def bench_format_dates(rows=100_000, number=3):
+    # ~ 10% ô trống như cột HAN_CHOT thực tế
+    dates = pd.Series(pd.date_range("2020-01-01", periods=rows, freq="37min"))
+    dates[::10] = pd.NaT
+    text = dates.dt.strftime("%d/%m/%Y").astype(object).where(dates.notna(), "")
+
+    def legacy(series):
+        return series.apply(lambda x: format_date_vn(x) if pd.notnull(x) else "-")
+
+    # Cách cũ gặp ô "" sẽ trả "" thay vì "-"; so sánh trên các ô có ngày
+    has_date = dates.notna()
+    assert (legacy(dates)[has_date] == format_date_column(dates)[has_date]).all()
+    sample = text[:5000]
+    assert (legacy(sample)[has_date[:5000]] == format_date_column(sample)[has_date[:5000]]).all()
+
+    _report(f"format cột datetime ({rows:,} dòng)", lambda: legacy(dates), lambda: format_date_column(dates), number)
+    # Cách cũ gọi pd.to_datetime cho từng ô chữ -> rất chậm, chỉ đo 1 lần
+    _report(f"format cột chữ dd/mm/yyyy ({rows:,} dòng)", lambda: legacy(text), lambda: format_date_column(text), 1)
+
+
+# =========================================================
+# 🔎 TÌM KIẾM CÔNG VIỆC
+# =========================================================
+def bench_task_search(rows=50_000, number=200):
+    words = ["Hợp", "đồng", "thẩm", "định", "dự", "án", "gói", "thầu", "báo", "cáo", "kiểm", "tra", "hồ", "sơ"]
+    words += [f"mục{i}" for i in range(2000)]
+    rng = pd.Series(words).sample(rows * 40, replace=True, random_state=0).to_numpy().reshape(rows, 40)
+    df = pd.DataFrame({
+        "ID_CONG_VIEC": [f"CV{i:05d}" for i in range(rows)],
+        "TEN_VIEC": [" ".join(r[:8]) for r in rng],
+        "NOI_DUNG": [" ".join(r[8:]) for r in rng],
+    })
+    index = build_search_index(df)
+    assert "CV00000" in search_index(index, " ".join(rng[0][:2]))
+
+    # Cách cũ: quét cả cột TEN_VIEC mỗi lần gõ (phân biệt dấu, không tìm trong NOI_DUNG)
+    _report(f"tìm 'hợp đồng' ({rows:,} việc)",
+            lambda: df[df["TEN_VIEC"].astype(str).str.contains("hợp đồng", case=False, na=False)],
+            lambda: search_index(index, "hop dong"), number)
+
+
+def check_search_after_insert(rows=20_000):
+    """Thêm 1 việc rồi tìm ngay: chỉ mục phải được bổ sung phần dòng mới, không dựng lại cả bảng."""
+    sheet = task_search.SEARCH_SHEET
+    df = pd.DataFrame({
+        "ID_CONG_VIEC": [f"CV{i:05d}" for i in range(rows)],
+        "TEN_VIEC": [f"Hợp đồng gói thầu {i}" for i in range(rows)],
+    })
+    builds = []
+    build = task_search.build_search_index
+    saved = (gsheet.get_backend, gsheet.get_backend_name, gsheet.WRITE_BEHIND)
+    with tempfile.TemporaryDirectory() as folder:
+        backend = SQLiteBackend(os.path.join(folder, "bench.sqlite3"))
+        backend.overwrite_sheet(sheet, df)
+        # Dùng SQLite tạm, ghi trực tiếp (không đụng dữ liệu / hàng đợi ghi thật)
+        gsheet.get_backend, gsheet.get_backend_name, gsheet.WRITE_BEHIND = (lambda: backend), (lambda: "sqlite"), False
+        task_search.build_search_index = lambda frame: builds.append(len(frame)) or build(frame)
+        try:
+            gsheet.refresh_cache([sheet])
+            search_tasks("hop dong")
+            search_tasks("hop dong") # Lần 2 lấy từ cache (đọc sẵn cấu hình TTL) để đo cho đúng
+            t0 = timeit.default_timer()
+            gsheet.append_rows(sheet, [{"ID_CONG_VIEC": "CV99999", "TEN_VIEC": "Nghiệm thu khẩn"}])
+            found = search_tasks("nghiem thu")
+            elapsed = timeit.default_timer() - t0
+        finally:
+            gsheet.get_backend, gsheet.get_backend_name, gsheet.WRITE_BEHIND = saved
+            task_search.build_search_index = build
+            gsheet.refresh_cache([sheet])
+    assert found == ["CV99999"], found
+    assert builds == [rows], f"chỉ mục bị dựng lại sau khi thêm dòng: {builds}"
+    print(f"{f'thêm 1 việc rồi tìm ({rows:,} việc)':<45} {elapsed * 1e3:9.1f} ms (chỉ bổ sung dòng mới)")
+
+
+if __name__ == "__main__":
+    bench_normalize_columns()
+    bench_format_dates()
+    bench_task_search()
+    check_search_after_insert()
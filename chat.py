@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from gsheet import load_all_sheets, save_raw_sheet
-from utils import get_display_list_multi, lookup_display
+from gsheet import load_sheets, append_rows, sheet_columns, get_display_index, get_display_list
+from utils import map_display, format_date_value, format_date_column
 
 # =========================================================
 # ✅ TAB TRAO ĐỔI CÔNG VIỆC (ĐÃ FIX LỖI THIẾU CỘT)
@@ -13,10 +13,11 @@ def render_chat_tab():
     # -----------------------------------------------------
     # ✅ Tải dữ liệu
     # -----------------------------------------------------
-    all_sheets = load_all_sheets()
+    # Công việc và nhân sự chỉ dùng cho dropdown / tra tên -> chỉ tải cột ID + cột hiển thị
+    columns = {name: sheet_columns(name) for name in ["7_CONG_VIEC", "1_NHAN_SU"]}
+    all_sheets = load_sheets(["7_CONG_VIEC", "10_TRAO_DOI", "1_NHAN_SU"], columns=columns)
     df_cv = all_sheets.get("7_CONG_VIEC", pd.DataFrame()).copy()
     df_chat = all_sheets.get("10_TRAO_DOI", pd.DataFrame()).copy()
-    df_ns = all_sheets.get("1_NHAN_SU", pd.DataFrame()).copy()
 
     # 🛠️ FIX LỖI KEY ERROR: Tự động thêm cột nếu thiếu
     required_cols = ["ID_CONG_VIEC", "NGUOI_GUI", "NOI_DUNG", "THOI_GIAN", "FILE_DINH_KEM"]
@@ -31,11 +32,14 @@ def render_chat_tab():
     # -----------------------------------------------------
     # ✅ Dropdown chọn công việc
     # -----------------------------------------------------
-    cv_display, cv_map = get_display_list_multi(
-        df_cv,
+    # Gõ để lọc trước khi chọn (lọc phía server, tránh dropdown hàng nghìn dòng)
+    tu_khoa_cv = st.text_input("🔎 Tìm công việc (mã, tên, không cần dấu)", "")
+    cv_display, cv_map = get_display_list(
+        "7_CONG_VIEC",
         id_col="ID_CONG_VIEC",
         cols=["TEN_VIEC", "HAN_CHOT"],
-        prefix="Chọn công việc..."
+        prefix="Chọn công việc...",
+        query=tu_khoa_cv,
     )
 
     selected_cv_display = st.selectbox("Chọn công việc", cv_display)
@@ -59,15 +63,11 @@ def render_chat_tab():
         # -----------------------------------------------------
         # ✅ Hiển thị dạng timeline
         # -----------------------------------------------------
-        for _, row in df_chat_filtered.iterrows():
-            nguoi_gui = lookup_display(
-                row["NGUOI_GUI"],
-                df_ns,
-                "ID_NHAN_SU",
-                ["HO_TEN", "CHUC_VU"]
-            )
-
-            thoi_gian = row["THOI_GIAN"]
+        # Tra tên người gửi cho cả cột 1 lần thay vì lọc bảng nhân sự theo từng tin nhắn
+        ns_index = get_display_index("1_NHAN_SU", ["HO_TEN", "CHUC_VU"])
+        ten_nguoi_gui = map_display(df_chat_filtered["NGUOI_GUI"], ns_index).tolist()
+        thoi_gian_hien_thi = format_date_column(df_chat_filtered["THOI_GIAN"], "%d/%m/%Y %H:%M", na="").tolist()
+        for (_, row), nguoi_gui, thoi_gian in zip(df_chat_filtered.iterrows(), ten_nguoi_gui, thoi_gian_hien_thi):
             noi_dung = row["NOI_DUNG"]
             file_dinh_kem = row.get("FILE_DINH_KEM", "")
 
@@ -83,8 +83,8 @@ def render_chat_tab():
     # -----------------------------------------------------
     # ✅ Form gửi tin nhắn mới
     # -----------------------------------------------------
-    ns_display, ns_map = get_display_list_multi(
-        df_ns,
+    ns_display, ns_map = get_display_list(
+        "1_NHAN_SU",
         id_col="ID_NHAN_SU",
         cols=["HO_TEN", "CHUC_VU"],
         prefix="Chọn người gửi..."
@@ -112,17 +112,10 @@ def render_chat_tab():
             "ID_CONG_VIEC": selected_cv_id,
             "NGUOI_GUI": nguoi_gui,
             "NOI_DUNG": noi_dung,
-            "THOI_GIAN": datetime.now().strftime("%d/%m/%Y %H:%M"),
+            "THOI_GIAN": format_date_value(datetime.now(), "THOI_GIAN"),
             "FILE_DINH_KEM": file_dinh_kem,
         }
 
-        # Đảm bảo DataFrame chat có đủ cột trước khi thêm
-        for col in required_cols:
-             if col not in df_chat.columns:
-                 df_chat[col] = ""
-
-        df_new = df_chat.copy()
-        df_new.loc[len(df_new)] = new_row
-
-        save_raw_sheet("10_TRAO_DOI", df_new)
+        # Chỉ thêm dòng mới, không ghi lại toàn bộ lịch sử trao đổi
+        append_rows("10_TRAO_DOI", [new_row])
         st.success("✅ Đã gửi trao đổi!")
@@ -17,27 +17,56 @@ REQUIRED_SHEETS = [
     "9_TRI_NHO_AI",      # Lưu hỏi–đáp Gemini
     "10_TRAO_DOI",       # Chat nội bộ theo công việc
     "11_TRI_NHO_AI",     # Trí nhớ AI dài hạn (SỬA TỪ 10 -> 11)
+    "12_LICH_SU",        # Số liệu công việc chụp theo ngày (biểu đồ xu hướng)
 ]
 
 # =========================================================
 # ✅ 2. CÁC CỘT NGÀY CẦN PARSE TỰ ĐỘNG
 # =========================================================
-DATE_COLS = [
-    "NGAY_BAN_HANH", "NGAY_BD", "NGAY_KT", "NGAY_KY",
-    "NGAY_HIEU_LUC", "NGAY_KET_THUC", "NGAY_GIAO",
-    "HAN_CHOT", "NGAY_THUC_TE_XONG", "THOI_GIAN", "NGAY_TAO",
-]
+# Cột ngày -> kiểu ("date": chỉ ngày, "datetime": ngày + giờ).
+# Chỉ các cột có tên ở đây mới được đọc thành ngày (không đoán theo tên cột).
+DATE_SCHEMA = {
+    "NGAY_BAN_HANH": "date",
+    "NGAY_BD": "date",
+    "NGAY_KT": "date",
+    "NGAY_KY": "date",
+    "NGAY_HIEU_LUC": "date",
+    "NGAY_KET_THUC": "date",
+    "NGAY_GIAO": "date",
+    "HAN_CHOT": "date",
+    "NGAY_THUC_TE_XONG": "date",
+    "THOI_GIAN": "datetime",
+    "NGAY_TAO": "date",
+    "NGAY_CHOT": "date",
+}
+DATE_COLS = list(DATE_SCHEMA)
+
+# Định dạng thử lần lượt khi đọc (định dạng chuẩn đứng đầu, sau đó là các kiểu cũ đã có trên Sheet)
+DATE_READ_FORMATS = {
+    "date": ["%d/%m/%Y", "%Y-%m-%d", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y"],
+    "datetime": ["%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y", "%Y-%m-%d"],
+}
+
+# Định dạng duy nhất khi ghi lên Sheet
+DATE_WRITE_FORMATS = {
+    "date": "%d/%m/%Y",
+    "datetime": "%d/%m/%Y %H:%M",
+}
 
 # =========================================================
 # ✅ 3. CẤU HÌNH LIÊN KẾT ID → MÔ TẢ
 # =========================================================
+# ID_COL: cột khóa | NAME_COL: tên ngắn dùng khi nối bảng (<CỘT>_TEN) |
+# DISPLAY_COLS: cột hiển thị trong dropdown | LINK_COLS: cột -> (sheet đích, cột ID đích)
 LINK_CONFIG_RAW = {
     "1_NHAN_SU": {
         "ID_COL": "ID_NHAN_SU",
+        "NAME_COL": "HO_TEN",
         "DISPLAY_COLS": ["HO_TEN", "CHUC_VU", "DIEN_THOAI"],
     },
     "2_DON_VI": {
         "ID_COL": "ID_DON_VI",
+        "NAME_COL": "TEN_DON_VI",
         "DISPLAY_COLS": ["TEN_DON_VI", "DIA_CHI", "DIEN_THOAI"],
         "LINK_COLS": {
             "IDNS_TEN_GIAM_DOC": ("1_NHAN_SU", "ID_NHAN_SU"),
@@ -46,6 +75,7 @@ LINK_CONFIG_RAW = {
     },
     "3_VAN_BAN": {
         "ID_COL": "ID_VB",
+        "NAME_COL": "SO_VAN_BAN",
         "DISPLAY_COLS": ["SO_VAN_BAN", "TRICH_YEU", "NGAY_BAN_HANH"],
         "LINK_COLS": {
             "IDNS_NGUOI_KY": ("1_NHAN_SU", "ID_NHAN_SU"),
@@ -60,10 +90,12 @@ LINK_CONFIG_RAW = {
     },
     "4_DU_AN": {
         "ID_COL": "ID_DU_AN",
+        "NAME_COL": "TEN_DU_AN",
         "DISPLAY_COLS": ["TEN_DU_AN", "MO_TA", "NGAY_BD"],
     },
     "5_GOI_THAU": {
         "ID_COL": "ID_GOI_THAU",
+        "NAME_COL": "TEN_GOI_THAU",
         "DISPLAY_COLS": ["TEN_GOI_THAU", "GIA_TRI", "NGAY_BD"],
         "LINK_COLS": {
             "IDDA_DU_AN": ("4_DU_AN", "ID_DU_AN"),
@@ -71,6 +103,7 @@ LINK_CONFIG_RAW = {
     },
     "6_HOP_DONG": {
         "ID_COL": "ID_HOP_DONG",
+        "NAME_COL": "TEN_HD",
         "DISPLAY_COLS": ["SO_HD", "TEN_HD", "NGAY_KY"],
         "LINK_COLS": {
             "IDDA_DU_AN": ("4_DU_AN", "ID_DU_AN"),
@@ -81,10 +114,12 @@ LINK_CONFIG_RAW = {
     },
     "7_CONG_VIEC": {
         "ID_COL": "ID_CONG_VIEC",
+        "NAME_COL": "TEN_VIEC",
         "DISPLAY_COLS": ["TEN_VIEC", "NOI_DUNG", "HAN_CHOT"],
         "LINK_COLS": {
             "NGUOI_GIAO": ("1_NHAN_SU", "ID_NHAN_SU"),
             "NGUOI_NHAN": ("1_NHAN_SU", "ID_NHAN_SU"),
+            "NGUOI_PHOI_HOP": ("1_NHAN_SU", "ID_NHAN_SU"), # Nhiều ID, cách nhau dấu phẩy
             "IDDV_CV": ("2_DON_VI", "ID_DON_VI"),
             "IDDA_CV": ("4_DU_AN", "ID_DU_AN"),
             "IDGT_CV": ("5_GOI_THAU", "ID_GOI_THAU"),
@@ -110,3 +145,104 @@ LINK_CONFIG_RAW = {
         "DISPLAY_COLS": ["LOAI", "THOI_GIAN", "TOM_TAT"],
     },
 }
+
+# =========================================================
+# ✅ 4. BỘ NHỚ ĐỆM DỮ LIỆU SHEET
+# =========================================================
+# Số giây giữ dữ liệu trong cache trước khi đọc lại từ Google Sheet
+# (để nhận các chỉnh sửa làm trực tiếp trên file Sheet, ngoài App).
+# Có thể ghi đè bằng [general] SHEET_CACHE_TTL trong secrets.toml.
+SHEET_CACHE_TTL = 300
+
+# Số luồng tối đa khi tải nhiều sheet cùng lúc (giới hạn để không vượt quota API)
+SHEET_FETCH_WORKERS = 6
+
+# =========================================================
+# ✅ 5. LƯU TẠM DỮ LIỆU TRÊN MÁY CHỦ (KHỞI ĐỘNG NHANH)
+# =========================================================
+# Thư mục lưu bản chụp (snapshot) các sheet đã làm sạch, dạng Parquet.
+# Khi App khởi động lại sẽ hiển thị ngay từ bản chụp rồi đồng bộ nền với Google Sheet.
+LOCAL_CACHE_DIR = ".qlcv_cache"
+
+# =========================================================
+# ✅ 6. NƠI LƯU TRỮ DỮ LIỆU (BACKEND)
+# =========================================================
+# "gsheets": Google Sheet (mặc định) | "sqlite": CSDL cục bộ có index, chạy nhanh / không cần mạng.
+# Có thể ghi đè bằng [general] STORAGE_BACKEND trong secrets.toml.
+STORAGE_BACKEND = "gsheets"
+SQLITE_PATH = LOCAL_CACHE_DIR + "/qlcv.sqlite3"
+
+# =========================================================
+# ✅ 7. GHI NỀN (WRITE-BEHIND)
+# =========================================================
+# True: bấm Lưu là xong ngay, thay đổi được ghi nhật ký cục bộ rồi gửi nền theo lô.
+# False: ghi trực tiếp, người dùng chờ đến khi ghi xong (như trước).
+WRITE_BEHIND = True
+WRITE_FLUSH_INTERVAL = 1.5    # giây giữa các lần gửi lô (các lệnh trong khoảng này được gộp)
+WRITE_RETRY_MAX_DELAY = 60    # giây chờ tối đa giữa các lần thử lại khi ghi lỗi
+WRITE_MAX_ATTEMPTS = 8        # lỗi quá số lần này -> chuyển sang danh sách lỗi, chờ người dùng bỏ / thử lại
+
+# =========================================================
+# ✅ 8. KIỂU DỮ LIỆU CÁC CỘT (GIẢM BỘ NHỚ CACHE)
+# =========================================================
+# Áp dụng khi tải sheet (sau khi chuẩn hóa tên cột + đọc ngày theo DATE_SCHEMA):
+# - "category": cột chữ ít giá trị khác nhau (trạng thái, loại...) lặp lại hàng nghìn lần
+# - "Float64" / "Int64": số (cho phép ô trống)
+# - "string": chữ lưu bằng Arrow
+# Cột chữ không khai báo ở đây cũng được đổi sang "string" (TEXT_AS_ARROW = True).
+# Cột nào có giá trị không đổi được (VD: GIA_TRI ghi "chưa rõ") thì giữ nguyên để không mất dữ liệu.
+SHEET_DTYPES = {
+    "1_NHAN_SU": {"CHUC_VU": "category"},
+    "5_GOI_THAU": {"GIA_TRI": "Float64"},
+    "7_CONG_VIEC": {
+        "TRANG_THAI_TONG": "category",
+        "TRANG_THAI_CHI_TIET": "category",
+        "LOAI_VIEC": "category",
+        "NGUON_GIAO_VIEC": "category",
+    },
+    "11_TRI_NHO_AI": {"LOAI": "category"},
+    "12_LICH_SU": {"NHOM": "category", "SO_VIEC": "Int64"},
+}
+TEXT_AS_ARROW = True
+
+# =========================================================
+# ✅ 9. MÃ ID TỰ SINH (CV001, CHAT001...)
+# =========================================================
+# Tiền tố -> (sheet, cột ID, số chữ số tối thiểu). Dùng bởi id_allocator.reserve().
+ID_SEQUENCES = {
+    "CV": ("7_CONG_VIEC", "ID_CONG_VIEC", 3),
+    "CHAT": ("9_TRI_NHO_AI", "ID_CHAT", 3),
+}
+
+# =========================================================
+# ✅ 10. CẤU TRÚC SHEET CÔNG VIỆC (22 CỘT)
+# =========================================================
+# Thứ tự cột chuẩn khi thêm công việc mới (giao thủ công hoặc từ Gemini).
+TASK_COLUMNS = [
+    "ID_CONG_VIEC", "TEN_VIEC", "NOI_DUNG", "LOAI_VIEC", "NGUON_GIAO_VIEC",
+    "NGUOI_GIAO", "NGUOI_NHAN", "NGAY_GIAO", "HAN_CHOT", "NGUOI_PHOI_HOP",
+    "TRANG_THAI_TONG", "TRANG_THAI_CHI_TIET", "NGAY_THUC_TE_XONG",
+    "IDVB_VAN_BAN", "IDHD_CV", "IDDA_CV", "IDGT_CV",
+    "VUONG_MAC", "DE_XUAT", "IDDV_CV", "GHI_CHU_CV", "EMAIL_BC_CV",
+]
+# Tên cột cũ / do Gemini trả về -> cột chuẩn
+TASK_COLUMN_ALIASES = {
+    "TRANG_THAI": "TRANG_THAI_TONG",
+    "GHI_CHU_GEMINI": "GHI_CHU_CV",
+    "GHI_CHU": "GHI_CHU_CV",
+}
+# Giá trị mặc định cho ô trống khi thêm mới
+TASK_DEFAULTS = {
+    "TRANG_THAI_TONG": "Đang thực hiện",
+}
+# Các trạng thái tổng (thứ tự hiển thị) và trạng thái coi là đã xong (không tính trễ hạn)
+TASK_STATUSES = ["Chưa thực hiện", "Đang thực hiện", "Hoàn thành", "Tạm dừng"]
+DONE_STATUSES = ["Hoàn thành"]
+
+# =========================================================
+# ✅ 11. LỊCH SỬ SỐ LIỆU CÔNG VIỆC (XU HƯỚNG / BURNDOWN)
+# =========================================================
+# Sheet lưu số việc theo trạng thái / người nhận / dự án qua từng ngày. Mỗi lần chụp chỉ ghi thêm
+# các nhóm có số việc thay đổi so với lần ghi trước (không ghi lại cả bảng mỗi ngày).
+HISTORY_SHEET = "12_LICH_SU"
+HISTORY_INTERVAL = 3600 # giây tối thiểu giữa 2 lần chụp trong cùng 1 ngày (mỗi tiến trình)
@@ -1,23 +1,15 @@
 import streamlit as st
 import pandas as pd
-from gsheet import load_all_sheets, save_raw_sheet
+from config import REQUIRED_SHEETS
+from gsheet import get_sheet, save_sheet_diff, refresh_cache, SheetConflictError, get_memory_report
+from utils import to_text_frame
+from storage import get_backend, get_backend_name, copy_sheets
 
 def render_data_manager_tab():
     st.header("📂 Quản lý dữ liệu gốc")
 
-    # 1. Tải dữ liệu
-    try:
-        all_sheets = load_all_sheets()
-    except Exception as e:
-        st.error(f"Lỗi kết nối: {e}")
-        return
-
-    if not all_sheets:
-        st.warning("Không đọc được dữ liệu nào từ file Sheet.")
-        return
-
-    # 2. Chọn Sheet
-    sheet_names = list(all_sheets.keys())
+    # 1. Chọn Sheet (chỉ tải sheet đang chọn, không tải toàn bộ)
+    sheet_names = list(REQUIRED_SHEETS)
     # Ưu tiên chọn tab đang bị lỗi để kiểm tra
     index_default = 0
     if "4_DU_AN" in sheet_names:
@@ -25,19 +17,23 @@ def render_data_manager_tab():
         
     selected_sheet = st.selectbox("Chọn bảng dữ liệu:", sheet_names, index=index_default)
     
-    # 3. Lấy dữ liệu
-    df = all_sheets.get(selected_sheet, pd.DataFrame())
+    # 2. Lấy dữ liệu
+    try:
+        df = get_sheet(selected_sheet)
+    except Exception as e:
+        st.error(f"Lỗi kết nối: {e}")
+        return
 
     st.markdown(f"### Đang chỉnh sửa: `{selected_sheet}`")
     
-    # 4. Hiển thị Data Editor
+    # 3. Hiển thị Data Editor
     # Nếu thực sự trống (0 dòng, 0 cột), tạo khung tạm
     if df.empty and len(df.columns) == 0:
         st.warning("⚠️ Bảng này chưa có tiêu đề cột.")
         df = pd.DataFrame(columns=["Cột A", "Cột B", "Cột C"])
     
-    # Ép kiểu sang string để hiển thị an toàn (tránh lỗi ngày tháng hiển thị)
-    df_display = df.astype(str)
+    # Ép kiểu sang chữ để hiển thị an toàn (ngày theo định dạng ghi chuẩn, ô trống giữ trống)
+    df_display = to_text_frame(df)
     
     edited_df = st.data_editor(
         df_display,
@@ -46,12 +42,58 @@ def render_data_manager_tab():
         key=f"editor_{selected_sheet}" 
     )
 
-    # 5. Nút Lưu
+    # 4. Nút Lưu
     if st.button("💾 Lưu thay đổi", type="primary"):
         try:
-            save_raw_sheet(selected_sheet, edited_df)
-            st.success("✅ Đã lưu thành công!")
+            # Chỉ gửi các ô/dòng thay đổi (ghi đè toàn bộ khi đổi tiêu đề cột)
+            result = save_sheet_diff(selected_sheet, df_display, edited_df)
+            if result["full"]:
+                st.success("✅ Đã lưu thành công (ghi lại toàn bộ bảng)!")
+            elif result["merged"]:
+                st.success(f"✅ Đã lưu và gộp với thay đổi mới của người khác: {result['changed']} ô sửa, {result['added']} dòng thêm, {result['deleted']} dòng xóa.")
+            else:
+                st.success(f"✅ Đã lưu: {result['changed']} ô sửa, {result['added']} dòng thêm, {result['deleted']} dòng xóa.")
             st.cache_data.clear()
+            st.session_state.pop("data_manager_conflict", None)
             st.rerun()
+        except SheetConflictError as e:
+            # Giữ lại qua lần chạy lại để nút "Tải lại" bên dưới còn hiển thị và bấm được
+            st.session_state["data_manager_conflict"] = (selected_sheet, str(e))
         except Exception as e:
             st.error(f"❌ Lỗi khi lưu: {e}")
+
+    conflict = st.session_state.get("data_manager_conflict")
+    if conflict and conflict[0] == selected_sheet:
+        st.error(f"⚠️ {conflict[1]}")
+        if st.button("🔄 Tải lại bảng này (bỏ các sửa đổi chưa lưu)"):
+            refresh_cache([selected_sheet])
+            st.session_state.pop("data_manager_conflict", None)
+            st.session_state.pop(f"editor_{selected_sheet}", None)
+            st.rerun()
+
+    # 5. Dung lượng dữ liệu đang giữ trong bộ nhớ đệm
+    with st.expander("📊 Dung lượng bộ nhớ đệm theo sheet"):
+        report = get_memory_report()
+        if report.empty:
+            st.caption("Chưa có sheet nào được tải trong tiến trình này.")
+        else:
+            st.dataframe(report, use_container_width=True, hide_index=True)
+            st.caption(f"Tổng: {report['TRUOC_MB'].sum():.2f} MB → {report['SAU_MB'].sum():.2f} MB")
+
+    # 6. Đồng bộ khi đang chạy trên CSDL SQLite cục bộ
+    if get_backend_name() == "sqlite":
+        with st.expander("🔁 Đồng bộ với Google Sheet"):
+            col1, col2 = st.columns(2)
+            if col1.button("⬆️ Đẩy dữ liệu lên Google Sheet"):
+                try:
+                    copied = copy_sheets(get_backend(), get_backend("gsheets"), sheet_names)
+                    st.success(f"✅ Đã đẩy {len(copied)} bảng lên Google Sheet.")
+                except Exception as e:
+                    st.error(f"❌ Lỗi đồng bộ: {e}")
+            if col2.button("⬇️ Nhập dữ liệu từ Google Sheet"):
+                try:
+                    copied = copy_sheets(get_backend("gsheets"), get_backend(), sheet_names)
+                    refresh_cache()
+                    st.success(f"✅ Đã nhập {len(copied)} bảng từ Google Sheet.")
+                except Exception as e:
+                    st.error(f"❌ Lỗi đồng bộ: {e}")
@@ -0,0 +1,123 @@
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+from linked_views import get_linked_view
+from utils import id_text, date_kind, parse_date_series
+
+# =========================================================
+# 🧮 BỘ LỌC DÙNG CHỈ MỤC (AND nhiều điều kiện, tạo bảng kết quả 1 lần)
+# =========================================================
+# - Cột mã / phân loại: mỗi giá trị -> mảng vị trí dòng (đã sắp xếp)
+# - Cột ngày: giá trị ngày đã sắp xếp + vị trí dòng tương ứng (lọc khoảng bằng searchsorted)
+# Các điều kiện cho ra mảng vị trí rồi giao nhau (bắt đầu từ mảng nhỏ nhất); chỉ cắt bảng 1 lần ở cuối.
+# Chỉ mục dựng 1 lần cho mỗi bảng nối sẵn (get_linked_view), dùng chung mọi phiên.
+FILTER_COLUMNS = {
+    "7_CONG_VIEC": {
+        "keys": ["ID_CONG_VIEC", "IDDA_CV", "IDGT_CV", "IDHD_CV", "LOAI_VIEC", "TRANG_THAI_TONG", "NGUOI_NHAN", "NGUOI_GIAO"],
+        "dates": ["NGAY_GIAO", "HAN_CHOT"],
+    },
+}
+
+class FilterIndex:
+    """Chỉ mục lọc của 1 bảng (vị trí dòng 0..n-1 theo thứ tự của bảng)."""
+
+    def __init__(self, df, key_cols=(), date_cols=()):
+        self.n = len(df)
+        self.keys = {}
+        for col in key_cols:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(id_text(df[col]).to_numpy())
+            order = np.argsort(codes, kind="stable") # Trong cùng 1 giá trị: vị trí tăng dần
+            starts = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.keys[col] = ({value: i for i, value in enumerate(uniques)}, starts, order)
+        self.dates = {}
+        for col in date_cols:
+            if col not in df.columns:
+                continue
+            dates = parse_date_series(df[col], date_kind(col) or "date")
+            valid = np.flatnonzero(dates.notna().to_numpy())
+            values = dates.to_numpy(dtype="datetime64[ns]")[valid]
+            order = np.argsort(values, kind="stable")
+            self.dates[col] = (values[order], valid[order])
+
+    def values(self, col):
+        """Các giá trị khác nhau (khác rỗng) của 1 cột mã / phân loại, theo thứ tự xuất hiện."""
+        lookup = self.keys.get(col, ({},))[0]
+        return [value for value in lookup if value != ""]
+
+    def rows_for(self, col, values):
+        """Vị trí các dòng có col thuộc values (mảng tăng dần)."""
+        lookup, starts, order = self.keys[col]
+        codes = [lookup[v] for v in dict.fromkeys(values) if v in lookup]
+        parts = [order[starts[c]:starts[c + 1]] for c in codes]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    def rows_between(self, col, start=None, end=None):
+        """Vị trí các dòng có ngày col trong [start, end] (bỏ trống 1 đầu = không giới hạn; ô trống bị loại)."""
+        values, rows = self.dates[col]
+        lo = 0 if start is None else np.searchsorted(values, np.datetime64(pd.Timestamp(start), "ns"), side="left")
+        hi = len(values) if end is None else np.searchsorted(values, np.datetime64(pd.Timestamp(end), "ns"), side="right")
+        return np.sort(rows[lo:hi])
+
+    def query(self, conditions=None, rows=None):
+        """
+        Vị trí các dòng thỏa mọi điều kiện (AND), tăng dần.
+        conditions: {cột: giá trị | list giá trị | (từ ngày, đến ngày)}; None / "" = bỏ qua điều kiện.
+        rows: giới hạn thêm trong các vị trí này (VD: kết quả tìm kiếm).
+        """
+        sets = []
+        for col, cond in (conditions or {}).items():
+            if cond is None or (isinstance(cond, str) and cond == ""):
+                continue
+            if col in self.dates:
+                start, end = cond
+                if start is None and end is None:
+                    continue
+                sets.append(self.rows_between(col, start, end))
+            elif col in self.keys:
+                sets.append(self.rows_for(col, [cond] if isinstance(cond, str) else list(cond)))
+            else:
+                raise KeyError(f"Cột {col} không có trong chỉ mục lọc")
+        if rows is not None:
+            sets.append(np.unique(np.asarray(rows, dtype=np.int64)))
+        if not sets:
+            return np.arange(self.n)
+
+        sets.sort(key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+@st.cache_resource
+def _get_filter_cache():
+    """(sheet_name, tuple cột) -> (bảng nối sẵn đã dùng để dựng, FilterIndex)."""
+    return {"lock": threading.Lock(), "indexes": {}}
+
+def get_filter_index(sheet_name, columns=None):
+    """
+    (bảng nối sẵn, chỉ mục lọc) của 1 sheet. Bảng trả về dùng chung, chỉ để đọc:
+    lọc bằng index.query(...) rồi cắt 1 lần bằng df.iloc[vị trí] (hoặc dùng query_sheet).
+    """
+    df = get_linked_view(sheet_name, columns, copy=False)
+    key = (sheet_name, tuple(columns) if columns else None)
+    cache = _get_filter_cache()
+    with cache["lock"]:
+        entry = cache["indexes"].get(key)
+    if entry is None or entry[0] is not df:
+        cfg = FILTER_COLUMNS.get(sheet_name, {})
+        entry = (df, FilterIndex(df, cfg.get("keys", ()), cfg.get("dates", ())))
+        with cache["lock"]:
+            cache["indexes"][key] = entry
+    return entry
+
+def query_sheet(sheet_name, conditions=None, columns=None):
+    """Bảng (bản sao) các dòng của sheet thỏa mọi điều kiện, VD: {"NGUOI_NHAN": "NS01", "HAN_CHOT": (None, hôm_nay)}."""
+    df, index = get_filter_index(sheet_name, columns)
+    return df.iloc[index.query(conditions)].copy()
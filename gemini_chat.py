@@ -1,19 +1,9 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 import google.generativeai as genai
-from gsheet import load_all_sheets, save_raw_sheet
-
-def generate_chat_id(df):
-    if df.empty or "ID_CHAT" not in df.columns: return "CHAT001"
-    existing = df["ID_CHAT"].dropna().astype(str).tolist()
-    nums = []
-    for x in existing:
-        if x.startswith("CHAT"):
-            try: nums.append(int(x.replace("CHAT", "")))
-            except: pass
-    next_num = max(nums) + 1 if nums else 1
-    return f"CHAT{next_num:03d}"
+from gsheet import get_sheet, append_rows
+from utils import format_date_value
+from id_allocator import next_id
 
 def render_gemini_chat_tab():
     st.header("🤖 Hỏi đáp Gemini")
@@ -24,8 +14,7 @@ def render_gemini_chat_tab():
     # 2. Nếu không có trong Secrets, mới tìm trong Sheet
     if not api_key:
         try:
-            all_sheets = load_all_sheets()
-            df_config = all_sheets.get("8_CAU_HINH", pd.DataFrame())
+            df_config = get_sheet("8_CAU_HINH")
             if not df_config.empty:
                 # Tìm cột trực tiếp
                 if "GEMINI_API_KEY" in df_config.columns:
@@ -55,18 +44,13 @@ def render_gemini_chat_tab():
             response = model.generate_content(cau_hoi)
             
             # Lưu lịch sử
-            all_sheets = load_all_sheets()
-            df_memory = all_sheets.get("9_TRI_NHO_AI", pd.DataFrame(columns=["ID_CHAT", "THOI_GIAN", "CAU_HOI", "CAU_TRA_LOI"]))
-            
             new_row = {
-                "ID_CHAT": generate_chat_id(df_memory),
-                "THOI_GIAN": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                "ID_CHAT": next_id("CHAT"),
+                "THOI_GIAN": format_date_value(datetime.now(), "THOI_GIAN"),
                 "CAU_HOI": cau_hoi,
                 "CAU_TRA_LOI": response.text,
             }
-            df_new = df_memory.copy()
-            df_new.loc[len(df_new)] = new_row
-            save_raw_sheet("9_TRI_NHO_AI", df_new)
+            append_rows("9_TRI_NHO_AI", [new_row])
             
             st.success("Đã trả lời!")
             st.write(response.text)
@@ -76,8 +60,7 @@ def render_gemini_chat_tab():
     # Lịch sử
     st.markdown("---")
     try:
-        all_sheets = load_all_sheets()
-        df_mem = all_sheets.get("9_TRI_NHO_AI", pd.DataFrame())
+        df_mem = get_sheet("9_TRI_NHO_AI")
         if not df_mem.empty:
             st.dataframe(df_mem.sort_values("THOI_GIAN", ascending=False).head(10), use_container_width=True)
     except:
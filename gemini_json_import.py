@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 import json
-from gsheet import load_all_sheets, save_raw_sheet
+from gsheet import append_rows
 
 
 # =========================================================
@@ -47,24 +47,10 @@ def render_json_import_tab():
     st.subheader("📄 Xem trước dữ liệu JSON")
     st.dataframe(df_json, use_container_width=True)
 
-    # -----------------------------------------------------
-    # ✅ Tải sheet AI_JSON_DATA
-    # -----------------------------------------------------
-    all_sheets = load_all_sheets()
-    df_ai = all_sheets.get("AI_JSON_DATA", pd.DataFrame())
-
     # -----------------------------------------------------
     # ✅ Nút lưu vào Google Sheets
     # -----------------------------------------------------
     if st.button("💾 Lưu vào AI_JSON_DATA", type="primary"):
-        df_new = df_ai.copy()
-
-        # Nếu sheet trống → tạo mới
-        if df_new.empty:
-            df_new = df_json
-        else:
-            # Ghép thêm dữ liệu mới
-            df_new = pd.concat([df_new, df_json], ignore_index=True)
-
-        save_raw_sheet("AI_JSON_DATA", df_new)
+        # Chỉ thêm các dòng mới (sheet trống → dòng tiêu đề được tạo tự động)
+        append_rows("AI_JSON_DATA", df_json)
         st.success("✅ Đã lưu dữ liệu JSON vào sheet AI_JSON_DATA!")
@@ -2,6 +2,11 @@ import streamlit as st
 import pandas as pd
 import google.generativeai as genai
 from datetime import datetime
+from utils import format_date_value
+
+
+# Các sheet cần để dựng context (tab gọi load_sheets(CONTEXT_SHEETS))
+CONTEXT_SHEETS = ["1_NHAN_SU", "3_VAN_BAN", "4_DU_AN", "5_GOI_THAU", "6_HOP_DONG"]
 
 
 # =========================================================
@@ -140,7 +145,7 @@ HÃY TRẢ VỀ JSON DUY NHẤT, KHÔNG GIẢI THÍCH.
                 df[col] = ""
 
         # Tự động thêm ngày tạo
-        df["NGAY_TAO"] = datetime.now().strftime("%d/%m/%Y")
+        df["NGAY_TAO"] = format_date_value(datetime.now(), "NGAY_TAO")
 
         return df
 
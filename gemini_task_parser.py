@@ -4,6 +4,10 @@ import google.generativeai as genai
 from datetime import datetime
 
 
+# Các sheet cần để dựng context (tab gọi load_sheets(CONTEXT_SHEETS))
+CONTEXT_SHEETS = ["1_NHAN_SU", "2_DON_VI", "3_VAN_BAN", "4_DU_AN", "5_GOI_THAU", "6_HOP_DONG"]
+
+
 # =========================================================
 # ✅ HÀM TẠO CONTEXT TỪ TẤT CẢ SHEET
 # =========================================================
@@ -1,18 +1,7 @@
 import streamlit as st
-import pandas as pd
-from gsheet import load_all_sheets, save_raw_sheet
-from gemini_task_parser import parse_task_from_chat
-
-def generate_task_id(df):
-    if df.empty or "ID_CONG_VIEC" not in df.columns: return "CV001"
-    existing = df["ID_CONG_VIEC"].dropna().astype(str).tolist()
-    nums = []
-    for x in existing:
-        if x.startswith("CV"):
-            try: nums.append(int(x.replace("CV", "")))
-            except: pass
-    next_num = max(nums) + 1 if nums else 1
-    return f"CV{next_num:03d}"
+from gsheet import load_sheets, get_sheet
+from gemini_task_parser import parse_task_from_chat, CONTEXT_SHEETS
+from task_store import insert_tasks
 
 def render_gemini_task_tab():
     st.header("🤖 Giao việc bằng Gemini")
@@ -21,10 +10,9 @@ def render_gemini_task_tab():
     api_key = st.secrets.get("general", {}).get("GEMINI_API_KEY", None)
 
     # 2. Fallback tìm trong Sheet (có Try/Except an toàn)
-    all_sheets = load_all_sheets()
     if not api_key:
         try:
-            df_config = all_sheets.get("8_CAU_HINH", pd.DataFrame())
+            df_config = get_sheet("8_CAU_HINH")
             if not df_config.empty:
                 if "GEMINI_API_KEY" in df_config.columns:
                     api_key = str(df_config["GEMINI_API_KEY"].iloc[0]).strip()
@@ -41,7 +29,9 @@ def render_gemini_task_tab():
     user_message = st.text_area("Mô tả công việc:", height=200)
     if st.button("🚀 Phân tích", type="primary"):
         if not user_message.strip(): return
-        tasks = parse_task_from_chat(api_key, user_message, all_sheets)
+        # Chỉ tải dữ liệu tham chiếu khi người dùng bấm Phân tích
+        context_sheets = load_sheets(CONTEXT_SHEETS)
+        tasks = parse_task_from_chat(api_key, user_message, context_sheets)
         if not tasks.empty:
             st.session_state["gemini_tasks"] = tasks
             st.success("Đã phân tích xong!")
@@ -51,18 +41,12 @@ def render_gemini_task_tab():
     if "gemini_tasks" in st.session_state:
         edited_tasks = st.data_editor(st.session_state["gemini_tasks"], num_rows="dynamic", use_container_width=True)
         if st.button("💾 Lưu công việc", type="primary"):
-            df_cv = all_sheets.get("7_CONG_VIEC", pd.DataFrame())
-            df_new = df_cv.copy()
-            for _, row in edited_tasks.iterrows():
-                # Tạo row an toàn
-                new_row = {"ID_CONG_VIEC": generate_task_id(df_new), "TRANG_THAI": "Đang thực hiện"}
-                for col in edited_tasks.columns:
-                    new_row[col] = row[col]
-                # Đảm bảo đủ cột
-                for col in df_new.columns:
-                    if col not in new_row: new_row[col] = ""
-                
-                df_new = pd.concat([df_new, pd.DataFrame([new_row])], ignore_index=True)
-            
-            save_raw_sheet("7_CONG_VIEC", df_new)
-            st.success("Đã lưu!")
+            # Chuẩn hóa cả lô về 22 cột chuẩn, cấp ID 1 lần, ghi 1 lần append
+            saved, issues = insert_tasks(edited_tasks)
+            for issue in issues:
+                st.warning(issue)
+            if saved.empty:
+                st.error("Không có công việc hợp lệ để lưu.")
+                return
+            del st.session_state["gemini_tasks"] # Tránh bấm Lưu lần 2 tạo trùng công việc
+            st.success(f"Đã lưu {len(saved)} công việc: {', '.join(saved['ID_CONG_VIEC'])}")
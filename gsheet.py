@@ -1,8 +1,21 @@
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
 import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from streamlit_gsheets import GSheetsConnection
-from config import REQUIRED_SHEETS
-from utils import normalize_columns, remove_duplicate_and_empty_cols, parse_dates 
+from config import REQUIRED_SHEETS, LINK_CONFIG_RAW, SHEET_CACHE_TTL, SHEET_FETCH_WORKERS, WRITE_BEHIND, SHEET_DTYPES, TEXT_AS_ARROW
+from snapshot_store import save_snapshot, load_snapshot, has_snapshot
+from storage import get_backend, get_backend_name, header_positions, to_cell_value
+from write_queue import get_write_queue
+from utils import (
+    normalize_columns, normalize_column_name, remove_duplicate_and_empty_cols, parse_dates, diff_frames,
+    format_dates, format_date_value, build_display_index, get_display_list_multi, filter_display_list, fold_vietnamese,
+    apply_dtypes, memory_bytes, parse_date_series, date_kind,
+)
 
 # =========================================================
 # 🔌 KẾT NỐI (Dùng thư viện chuẩn Streamlit)
@@ -11,63 +24,885 @@ def get_conn():
     """Tạo kết nối tới Google Sheet dùng st.connection"""
     return st.connection("gsheets", type=GSheetsConnection)
 
+# Mọi thao tác đọc/ghi đi qua backend trong storage.py (Google Sheets hoặc SQLite),
+# chọn bằng STORAGE_BACKEND trong config.py / secrets.toml.
+
+# =========================================================
+# 🗃️ BỘ NHỚ ĐỆM THEO SHEET (Cache + Version)
+# =========================================================
+@st.cache_resource
+def _get_sheet_cache():
+    """
+    Bộ nhớ đệm dùng chung cho mọi phiên trong cùng tiến trình:
+    - data: sheet_name -> DataFrame đã làm sạch
+    - loaded_at: sheet_name -> thời điểm tải (time.time())
+    - version: sheet_name -> số phiên bản, tăng mỗi khi dữ liệu thay đổi
+    - refreshing: các sheet đang được đồng bộ nền (sau khi khởi động từ bản chụp)
+    - projections: (sheet_name, tuple cột) -> (version, loaded_at, DataFrame chỉ gồm các cột đó)
+    - indexes: (sheet_name, tuple cột hiển thị) -> (version, dict ID -> tên hiển thị)
+    - dropdowns: (sheet_name, id_col, tuple cột, prefix) -> (version, (list hiển thị, map, list bỏ dấu))
+    - memory: sheet_name -> dung lượng trước/sau khi ép kiểu + cảnh báo (get_memory_report)
+    - appends: sheet_name -> [(version trước, version sau, số dòng trước khi thêm)] của các lần
+      chỉ thêm dòng vào cuối (để các bảng tổng hợp cộng dồn phần mới, get_appended_since)
+    """
+    return {"lock": threading.RLock(), "data": {}, "loaded_at": {}, "version": {}, "refreshing": set(),
+            "projections": {}, "indexes": {}, "dropdowns": {}, "memory": {}, "appends": {}}
+
+def _cache_ttl():
+    """TTL (giây) cho dữ liệu bị sửa trực tiếp trên Google Sheet. Ưu tiên secrets."""
+    try:
+        return float(st.secrets.get("general", {}).get("SHEET_CACHE_TTL", SHEET_CACHE_TTL))
+    except Exception:
+        return float(SHEET_CACHE_TTL)
+
+APPEND_LOG_SIZE = 50 # Số lần thêm dòng gần nhất được ghi nhớ cho mỗi sheet
+
+def get_appended_since(sheet_name, version):
+    """
+    Nếu từ version đến nay sheet chỉ được thêm dòng vào cuối: trả về số dòng lúc ở version đó
+    (các dòng từ vị trí này trở đi là dòng mới). Có thay đổi khác / không rõ -> None.
+    """
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        current = cache["version"].get(sheet_name, 0)
+        start = None
+        for before, after, n_rows in cache["appends"].get(sheet_name, []):
+            if before == version:
+                start = n_rows if start is None else start
+                version = after
+        return start if start is not None and version == current else None
+
+def get_sheet_version(sheet_name):
+    """Trả về số phiên bản hiện tại của sheet (dùng làm khóa cache cho các bước xử lý sau)."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        return cache["version"].get(sheet_name, 0)
+
+def invalidate_sheet(sheet_name):
+    """Xóa cache của 1 sheet và tăng version để lần đọc sau lấy dữ liệu mới."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        cache["data"].pop(sheet_name, None)
+        cache["loaded_at"].pop(sheet_name, None)
+        cache["appends"].pop(sheet_name, None)
+        for store in (cache["projections"], cache["indexes"], cache["dropdowns"]):
+            for key in [k for k in store if k[0] == sheet_name]:
+                del store[key]
+        cache["version"][sheet_name] = cache["version"].get(sheet_name, 0) + 1
+
+def refresh_cache(sheet_names=None):
+    """Làm mới thủ công: xóa cache của các sheet chỉ định (mặc định: tất cả, kể cả sheet chỉ tải 1 số cột)."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        if sheet_names is None:
+            names = set(cache["data"]) | set(cache["version"]) | {key[0] for key in cache["projections"]}
+        else:
+            names = list(sheet_names)
+    for name in names:
+        invalidate_sheet(name)
+
+def _get_cached(sheet_name):
+    """Lấy bản sao DataFrame từ cache nếu còn hạn, ngược lại trả về None."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        df = cache["data"].get(sheet_name)
+        if df is None:
+            return None
+        if time.time() - cache["loaded_at"].get(sheet_name, 0) > _cache_ttl():
+            return None
+        # Trả bản sao để các tab thêm cột / sửa dữ liệu không làm bẩn cache
+        return df.copy()
+
+def _set_cached(sheet_name, df, expected_version=None):
+    """
+    Đưa DataFrame vào cache. Nếu có expected_version mà sheet đã bị ghi trong lúc tải
+    (version đổi) thì bỏ qua để không đè dữ liệu cũ lên dữ liệu mới.
+    """
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        if expected_version is not None and cache["version"].get(sheet_name, 0) != expected_version:
+            return False
+        cache["data"][sheet_name] = df
+        cache["loaded_at"][sheet_name] = time.time()
+        cache["version"][sheet_name] = cache["version"].get(sheet_name, 0) + 1
+        return True
+
+def _project(df, columns):
+    """Cắt bảng còn các cột cần (giữ thứ tự yêu cầu, bỏ cột không có). Bảng cắt chỉ để đọc."""
+    df = df[[c for c in columns if c in df.columns]]
+    df.attrs.pop("revision", None) # Không dùng bảng thiếu cột để ghi lại Sheet
+    return df
+
+def _get_projected(sheet_name, columns):
+    """
+    Lấy bảng chỉ gồm các cột cần: cắt từ bảng đầy đủ nếu đã có trong cache,
+    không thì dùng bản đã tải riêng các cột này (nếu cùng version và còn hạn).
+    """
+    df = _get_cached(sheet_name)
+    if df is not None:
+        return _project(df, columns)
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        entry = cache["projections"].get((sheet_name, columns))
+        if entry is None or entry[0] != cache["version"].get(sheet_name, 0):
+            return None
+        if time.time() - entry[1] > _cache_ttl():
+            return None
+        return entry[2].copy()
+
+def _set_projected(sheet_name, columns, df, expected_version):
+    """
+    Lưu bảng đã cắt cột nếu sheet không bị ghi trong lúc tải.
+    Lần tải đầu không tăng version; tải lại thay bản cũ của cùng các cột (hết TTL, dữ liệu có thể
+    đã bị sửa ngoài App) thì tăng version như _set_cached và bỏ các bản cắt cột / chỉ mục cũ của sheet.
+    """
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        if cache["version"].get(sheet_name, 0) != expected_version:
+            return False
+        if (sheet_name, columns) in cache["projections"]:
+            invalidate_sheet(sheet_name)
+        cache["projections"][(sheet_name, columns)] = (cache["version"].get(sheet_name, 0), time.time(), df)
+        return True
+
+def sheet_columns(sheet_name, extra=()):
+    """
+    Các cột tối thiểu của 1 sheet cho danh sách chọn / tra tên:
+    ID_COL + NAME_COL + DISPLAY_COLS trong LINK_CONFIG_RAW (cộng thêm cột extra nếu cần).
+    """
+    cfg = LINK_CONFIG_RAW.get(sheet_name, {})
+    cols = [cfg.get("ID_COL"), cfg.get("NAME_COL")] + list(cfg.get("DISPLAY_COLS", [])) + list(extra)
+    return [c for c in dict.fromkeys(cols) if c]
+
+def get_syncing_sheets():
+    """Danh sách sheet đang đồng bộ nền (để hiển thị trạng thái trên giao diện)."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        return sorted(cache["refreshing"])
+
+def _use_snapshots():
+    """Bản chụp cục bộ chỉ cần khi đọc từ Google Sheet (SQLite vốn đã là dữ liệu cục bộ)."""
+    return get_backend_name() == "gsheets"
+
+def _warm_start(sheet_name):
+    """
+    Lần đầu tiến trình cần 1 sheet: lấy ngay từ bản chụp cục bộ (nếu có)
+    thay vì chờ Google Sheet. Trả về DataFrame hoặc None.
+    """
+    if not _use_snapshots():
+        return None
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        if sheet_name in cache["version"]: # Đã tải/ghi trong tiến trình này -> phải lấy dữ liệu thật
+            return None
+    snap = load_snapshot(sheet_name)
+    if snap is None:
+        return None
+    df, fetched_at = snap
+    df = _overlay_pending(sheet_name, df)
+    _set_cached(sheet_name, df, expected_version=0)
+    return df.copy()
+
+def _refresh_in_background(sheet_names):
+    """Đồng bộ nền các sheet vừa lấy từ bản chụp; dữ liệu mới thay vào cache khi về."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        names = [n for n in sheet_names if n not in cache["refreshing"]]
+        cache["refreshing"].update(names)
+    if not names:
+        return
+
+    backend = get_backend()
+    def _run():
+        try:
+            _fetch_sheets(names, backend=backend)
+        finally:
+            with cache["lock"]:
+                cache["refreshing"].difference_update(names)
+
+    threading.Thread(target=_run, daemon=True).start()
+
+# =========================================================
+# 🔖 MÃ PHIÊN BẢN DỮ LIỆU (Kiểm soát ghi đồng thời)
+# =========================================================
+class SheetConflictError(Exception):
+    """Sheet đã bị người khác thay đổi kể từ lúc tải, không thể ghi an toàn."""
+
+def _revision_column(sheet_name, df):
+    """Cột định vị dòng khi gộp thay đổi: cột ID trong LINK_CONFIG_RAW, nếu không có thì cột đầu tiên."""
+    id_col = LINK_CONFIG_RAW.get(sheet_name, {}).get("ID_COL")
+    if id_col and id_col in df.columns:
+        return id_col
+    return df.columns[0] if len(df.columns) else None
+
+def _revision_text(value):
+    """Đưa 1 giá trị về chuỗi so sánh được giữa dữ liệu đã làm sạch và dữ liệu thô (1.0 == "1")."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    text = str(value).strip()
+    return text.split(".")[0] if re.fullmatch(r"-?\d+\.0+", text) else text
+
+def _revision_values(series):
+    """Như _revision_text cho cả 1 cột (vector hóa)."""
+    text = series.astype("string").fillna("").str.strip()
+    return text.str.replace(r"^(-?\d+)\.0+$", r"\1", regex=True)
+
+def compute_revision(raw):
+    """
+    Mã phiên bản của 1 sheet tính trên dữ liệu thô: tiêu đề + số dòng + hash nội dung mọi ô
+    (sửa 1 ô bất kỳ, thêm / xóa dòng kể cả dòng không có ID đều làm mã thay đổi).
+    """
+    if raw is None or (raw.empty and len(raw.columns) == 0):
+        return "0:empty"
+    # Hai bên so sánh đều là dữ liệu thô của cùng backend -> hash thẳng giá trị, không cần chuẩn hóa từng ô
+    values = raw.set_axis(range(raw.shape[1]), axis=1).astype(object).fillna("")
+    digest = hashlib.sha1("\x1f".join(normalize_column_name(c) for c in raw.columns).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    return f"{len(raw)}:{digest.hexdigest()[:16]}"
+
+def _raw_revision(sheet_name, raw):
+    """Mã phiên bản tính trên dữ liệu thô vừa tải (trước khi làm sạch/chuyển kiểu ngày)."""
+    return compute_revision(raw)
+
+def get_live_revision(sheet_name):
+    """Đọc mã phiên bản hiện tại trên backend (đọc lại cả bảng thô)."""
+    return compute_revision(get_backend().read_sheet(sheet_name))
+
+def _check_revision(sheet_name, df_base):
+    """
+    So sánh mã phiên bản lúc tải (df_base.attrs["revision"]) với dữ liệu hiện tại (đọc lại cả bảng thô).
+    Trả về (khớp?, danh sách ID hiện có trên Sheet hoặc None). Không có mã -> coi như khớp.
+    """
+    expected = df_base.attrs.get("revision")
+    key_col = _revision_column(sheet_name, df_base)
+    if not expected or not key_col:
+        return True, None
+    live = get_backend().read_sheet(sheet_name)
+    columns = {normalize_column_name(c): c for c in live.columns}
+    live_ids = _revision_values(live[columns[key_col]]).tolist() if key_col in columns else []
+    if compute_revision(live) == expected:
+        return True, live_ids
+    return _only_appended(live, expected, df_base, key_col, live_ids), live_ids
+
+def _only_appended(live, expected, df_base, key_col, live_ids):
+    """
+    Sheet khác mã lúc tải chỉ vì có thêm dòng ở cuối mà df_base đã chứa (dòng do chính App thêm,
+    cache giữ nguyên bảng thay vì tải lại): phần đầu khớp mã cũ và mọi dòng mới có ID nằm trong df_base.
+    """
+    try:
+        n_rows = int(str(expected).split(":")[0])
+    except ValueError:
+        return False
+    if n_rows >= len(live) or compute_revision(live.iloc[:n_rows]) != expected:
+        return False
+    base_ids = set(_revision_values(df_base[key_col])) if key_col in df_base.columns else set()
+    return all(key and key in base_ids for key in live_ids[n_rows:])
+
 # =========================================================
 # 📥 TẢI DỮ LIỆU (Load All Sheets)
 # =========================================================
-def load_all_sheets():
+def _read_raw(backend, sheet_name, columns=None):
+    """Lấy dữ liệu thô của 1 sheet (hoặc chỉ các cột chỉ định) từ backend (chạy được trong luồng phụ)."""
+    df = backend.read_sheet(sheet_name) if columns is None else backend.read_columns(sheet_name, columns)
+    if df is None: df = pd.DataFrame()
+    return df
+
+def _clean_sheet(df, sheet_name=None, issues=None):
+    """Áp dụng chuỗi làm sạch dữ liệu cho 1 sheet vừa tải về."""
+    # --- GỌI CÁC HÀM LÀM SẠCH TỪ UTILS.PY ---
+    if not df.empty:
+        # 1. Chuẩn hóa tên cột (Viết hoa, bỏ dấu, thay khoảng trắng)
+        df = normalize_columns(df)
+
+        # 2. Xóa cột trùng tên và cột trống vô nghĩa
+        df = remove_duplicate_and_empty_cols(df)
+
+        # 3. Xử lý ngày tháng
+        df = parse_dates(df)
+
+        # 4. Ép kiểu gọn bộ nhớ theo SHEET_DTYPES (category, số, chữ Arrow)
+        df, dtype_issues = apply_dtypes(df, SHEET_DTYPES.get(sheet_name, {}), TEXT_AS_ARROW)
+        if issues is not None: issues.extend(dtype_issues)
+
+    return df
+
+def _record_memory(sheet_name, before, df, issues):
+    """Ghi lại dung lượng trước/sau khi ép kiểu của 1 sheet (xem get_memory_report)."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        cache["memory"][sheet_name] = {"before": before, "after": memory_bytes(df), "issues": list(issues)}
+
+def get_memory_report():
+    """Bảng dung lượng cache theo sheet: trước/sau khi ép kiểu (MB), % giảm, cảnh báo kiểu dữ liệu."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        stats = dict(cache["memory"])
+    rows = []
+    for name, info in sorted(stats.items()):
+        before, after = info["before"], info["after"]
+        rows.append({
+            "SHEET": name,
+            "TRUOC_MB": round(before / 1e6, 2),
+            "SAU_MB": round(after / 1e6, 2),
+            "GIAM_%": round(100 * (1 - after / before), 1) if before else 0.0,
+            "CANH_BAO": "; ".join(info["issues"]),
+        })
+    return pd.DataFrame(rows, columns=["SHEET", "TRUOC_MB", "SAU_MB", "GIAM_%", "CANH_BAO"])
+
+def _fetch_sheets(sheet_names, backend=None, columns=None):
     """
-    Đọc toàn bộ các sheet được khai báo trong config.py, áp dụng làm sạch dữ liệu.
+    Đọc song song nhiều sheet bằng thread pool giới hạn (SHEET_FETCH_WORKERS).
+    Sheet nào về trước được làm sạch + đưa vào cache trước; lỗi của sheet nào
+    chỉ ảnh hưởng sheet đó (trả về bảng rỗng). Dữ liệu mới được ghi bản chụp ở luồng nền.
+    columns: dict sheet_name -> tuple cột; sheet có trong đây chỉ tải các cột đó
+    (cache riêng, không ghi bản chụp).
+    """
+    columns = columns or {}
+    results = {}
+    fresh = {}
+    try:
+        if backend is None: backend = get_backend()
+    except Exception as e:
+        return {name: pd.DataFrame() for name in sheet_names}
+
+    versions = {name: get_sheet_version(name) for name in sheet_names}
+
+    # Gắn ScriptRunContext cho luồng phụ để st.cache_data bên trong conn.read hoạt động bình thường
+    ctx = get_script_run_ctx()
+    def _init_worker():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    workers = max(1, min(SHEET_FETCH_WORKERS, len(sheet_names)))
+    with ThreadPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(_read_raw, backend, name, columns.get(name)): name for name in sheet_names}
+        for future in as_completed(futures):
+            sheet_name = futures[future]
+            try:
+                raw = future.result()
+                if sheet_name in columns:
+                    clean = _clean_sheet(raw, sheet_name)
+                    df = _project(_overlay_pending(sheet_name, clean), columns[sheet_name])
+                    _set_projected(sheet_name, columns[sheet_name], df, versions[sheet_name])
+                    results[sheet_name] = df.copy()
+                    continue
+
+                revision = _raw_revision(sheet_name, raw)
+                before = memory_bytes(raw)
+                issues = []
+                clean = _clean_sheet(raw, sheet_name, issues)
+                _record_memory(sheet_name, before, clean, issues)
+                # Mã phiên bản của dữ liệu thật trên Sheet mà bảng này dựa vào
+                clean.attrs["revision"] = revision
+                df = _overlay_pending(sheet_name, clean)
+                if _set_cached(sheet_name, df, expected_version=versions[sheet_name]):
+                    fresh[sheet_name] = clean # Bản chụp chỉ chứa dữ liệu đã có trên Sheet
+                results[sheet_name] = df.copy()
+            except Exception as e:
+                # Nếu Sheet chưa có trong file, tạo bảng rỗng
+                results[sheet_name] = pd.DataFrame()
+
+    if fresh and _use_snapshots():
+        fetched_at = time.time()
+        def _save_all():
+            for name, df in fresh.items():
+                save_snapshot(name, df, fetched_at)
+        threading.Thread(target=_save_all, daemon=True).start()
+
+    return results
+
+def load_sheets(sheet_names, columns=None):
     """
-    conn = get_conn()
+    Chỉ đọc + làm sạch các sheet được yêu cầu (dict sheet_name -> DataFrame).
+    Sheet nào còn trong cache (chưa hết TTL, chưa bị ghi) thì không gọi lại Google Sheet;
+    lần đầu sau khi khởi động thì lấy từ bản chụp cục bộ; còn lại được tải song song.
+
+    columns (tùy chọn): dict sheet_name -> list cột cần dùng. Các sheet này chỉ tải đúng
+    những cột đó (bỏ các cột chữ dài như NOI_DUNG, VUONG_MAC...). Bảng trả về chỉ để đọc,
+    không dùng để ghi lại Sheet.
+    """
+    names = list(dict.fromkeys(sheet_names)) # Bỏ tên trùng, giữ thứ tự
+    projections = {name: tuple(cols) for name, cols in (columns or {}).items() if name in names}
     all_data = {}
-    
-    # Duyệt qua danh sách sheet cần thiết trong Config
-    for sheet_name in REQUIRED_SHEETS:
-        try:
-            df = conn.read(worksheet=sheet_name, ttl=0) # ttl=0: Luôn lấy dữ liệu mới nhất
-            
-            if df is None: df = pd.DataFrame()
-            
-            # --- GỌI CÁC HÀM LÀM SẠCH TỪ UTILS.PY ---
-            if not df.empty:
-                # 1. Chuẩn hóa tên cột (Viết hoa, bỏ dấu, thay khoảng trắng)
-                df = normalize_columns(df) 
-                
-                # 2. Xóa cột trùng tên và cột trống vô nghĩa
-                df = remove_duplicate_and_empty_cols(df)
-
-                # 3. Xử lý ngày tháng
-                df = parse_dates(df)
-            
+    missing = []
+    warmed = []
+
+    for sheet_name in names:
+        cols = projections.get(sheet_name)
+        df = _get_cached(sheet_name) if cols is None else _get_projected(sheet_name, cols)
+        if df is None:
+            # Khởi động lạnh: hiển thị ngay từ bản chụp, đồng bộ Google Sheet ở nền
+            df = _warm_start(sheet_name)
+            if df is not None:
+                warmed.append(sheet_name)
+                if cols is not None: df = _project(df, cols)
+        if df is not None:
             all_data[sheet_name] = df
-            
-        except Exception as e:
-            # Nếu Sheet chưa có trong file, tạo bảng rỗng
-            all_data[sheet_name] = pd.DataFrame()
-            
-    return all_data
+        else:
+            missing.append(sheet_name)
+
+    if missing:
+        # Chưa có bản chụp cục bộ: tải cả bảng 1 lần (để ghi bản chụp cho lần khởi động sau) rồi mới cắt cột
+        full = {n for n in missing if n in projections and _use_snapshots() and not has_snapshot(n)}
+        fetched = _fetch_sheets(missing, columns={n: projections[n] for n in missing if n in projections and n not in full})
+        for name in full:
+            fetched[name] = _project(fetched[name], projections[name])
+        all_data.update(fetched)
+    if warmed:
+        _refresh_in_background(warmed)
+
+    return {name: all_data[name] for name in names}
+
+def get_sheet(sheet_name):
+    """Đọc 1 sheet (đã làm sạch). Sheet không tồn tại -> DataFrame rỗng."""
+    return load_sheets([sheet_name])[sheet_name]
+
+def get_display_index(sheet_name, display_cols=None):
+    """
+    Chỉ mục ID -> tên hiển thị của 1 sheet danh mục theo LINK_CONFIG_RAW
+    (ID_COL + DISPLAY_COLS, hoặc display_cols nếu truyền vào).
+    Dựng 1 lần cho mỗi version của sheet; dùng với utils.map_display để tra cả cột.
+    """
+    cfg = LINK_CONFIG_RAW.get(sheet_name, {})
+    id_col = cfg.get("ID_COL")
+    cols = tuple(display_cols or cfg.get("DISPLAY_COLS", []))
+    if not id_col:
+        return {}
+
+    # Cùng cách cắt cột với các tab (sheet_columns) để dùng lại bảng đã có trong cache
+    df = load_sheets([sheet_name], columns={sheet_name: sheet_columns(sheet_name, extra=cols)})[sheet_name]
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        version = cache["version"].get(sheet_name, 0)
+        entry = cache["indexes"].get((sheet_name, cols))
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+    index = build_display_index(df, id_col, cols)
+    with cache["lock"]:
+        cache["indexes"][(sheet_name, cols)] = (version, index)
+    return index
+
+def get_display_list(sheet_name, id_col=None, cols=None, prefix="Chọn...", query="", limit=200):
+    """
+    Danh sách dropdown 'ID | Tên - Mô tả' + map ngược về ID của 1 sheet
+    (mặc định ID_COL/DISPLAY_COLS trong LINK_CONFIG_RAW), dựng 1 lần cho mỗi version của sheet.
+    query: lọc gõ-để-tìm phía server (không dấu, không phân biệt hoa thường), tối đa limit mục.
+    Không được sửa list/dict trả về (dùng chung giữa các phiên).
+    """
+    cfg = LINK_CONFIG_RAW.get(sheet_name, {})
+    id_col = id_col or cfg.get("ID_COL")
+    cols = tuple(cols or cfg.get("DISPLAY_COLS", []))
+    if not id_col:
+        return [prefix], {prefix: ""}
+
+    df = load_sheets([sheet_name], columns={sheet_name: sheet_columns(sheet_name, extra=(id_col, *cols))})[sheet_name]
+    key = (sheet_name, id_col, cols, prefix)
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        version = cache["version"].get(sheet_name, 0)
+        entry = cache["dropdowns"].get(key)
+    if entry is None or entry[0] != version:
+        display_list, mapping = get_display_list_multi(df, id_col, list(cols), prefix)
+        folded = [fold_vietnamese(x).lower() for x in display_list]
+        entry = (version, (display_list, mapping, folded))
+        with cache["lock"]:
+            cache["dropdowns"][key] = entry
+
+    display_list, mapping, folded = entry[1]
+    if query:
+        display_list = filter_display_list(display_list, query, limit, folded)
+    return display_list, mapping
+
+def load_all_sheets():
+    """
+    Đọc toàn bộ các sheet được khai báo trong config.py, áp dụng làm sạch dữ liệu.
+    Chỉ nên dùng khi thực sự cần tất cả; các tab nên gọi load_sheets()/get_sheet().
+    """
+    return load_sheets(REQUIRED_SHEETS)
 
 # =========================================================
 # 💾 LƯU DỮ LIỆU
 # =========================================================
-def save_raw_sheet(sheet_name, df_new):
+def _prepare_for_sheet(df_new):
+    """Chuẩn bị DataFrame trước khi ghi: ngày -> chuỗi, NaN/None -> chuỗi rỗng."""
+    # Chuyển datetime về chuỗi theo định dạng ghi chuẩn (DATE_WRITE_FORMATS) để lưu lên Sheet không bị lỗi
+    df_save = format_dates(df_new)
+
+    for col in df_save.columns:
+        # category / Float64 / chữ Arrow -> object để điền "" được
+        values = df_save[col].astype(object)
+        # Ô ngày lẻ (date/Timestamp) trong cột chữ, VD dòng mới nhập từ bảng sửa; số nguyên kiểu float (Float64) -> int
+        values = values.map(lambda v: format_date_value(v, col) if hasattr(v, "strftime")
+                            else int(v) if isinstance(v, float) and v.is_integer() else v)
+        df_save[col] = values.where(values.notna(), "") # Thay NaN/None/<NA> bằng chuỗi rỗng
+
+    return df_save
+
+# ---------------------------------------------------------
+# Thực thi lệnh ghi (gọi trực tiếp, hoặc từ luồng nền của write_queue)
+# ---------------------------------------------------------
+def _resolve_rows(backend, sheet_name, keys):
+    """
+    keys: list (id, vị_trí lúc tải). Trả về list vị trí dòng hiện tại trên Sheet.
+    Ưu tiên tra theo cột ID (LINK_CONFIG_RAW) trên dữ liệu mới nhất để không ghi nhầm dòng
+    khi người khác vừa thêm/xóa dòng; nếu không tra được hết thì dùng vị trí lúc tải.
     """
-    Ghi đè dữ liệu vào Sheet
+    by_order = [pos for _, pos in keys]
+    id_col = LINK_CONFIG_RAW.get(sheet_name, {}).get("ID_COL")
+    if not id_col or any(key is None for key, _ in keys):
+        return by_order
+
+    live_pos = {}
+    for pos, val in enumerate(_revision_text(v) for v in backend.read_column(sheet_name, id_col)):
+        live_pos[val] = None if val in live_pos else pos # None: ID trùng -> không tra được
+
+    by_id = [live_pos.get(key) for key, _ in keys]
+    return by_order if any(pos is None for pos in by_id) else by_id
+
+def _live_ids(backend, sheet_name):
+    """Tập ID hiện có trên backend của sheet (đã chuẩn hóa); sheet không có cột ID -> None."""
+    id_col = LINK_CONFIG_RAW.get(sheet_name, {}).get("ID_COL")
+    if not id_col:
+        return None
+    try:
+        return {_revision_text(v) for v in backend.read_column(sheet_name, id_col)}
+    except KeyError: # Chưa có cột ID -> chưa có dòng nào mang ID
+        return set()
+
+def _apply_write(sheet_name, kind, payload, replayed=False):
+    """
+    Thực hiện 1 lệnh ghi (xem định dạng payload trong write_queue.py) lên backend.
+    replayed: lệnh có thể đã được gửi 1 phần (đọc lại từ nhật ký sau khi dừng giữa chừng / lỗi giữa chừng)
+    -> bỏ các dòng thêm mà ID đã có trên Sheet, các dòng xóa mà ID không còn (sheet không có cột ID thì không kiểm được).
+    """
+    backend = get_backend()
+    if kind == "overwrite":
+        backend.overwrite_sheet(sheet_name, pd.DataFrame(payload["rows"], columns=payload["columns"]))
+    elif kind == "append":
+        records = payload["records"]
+        live = _live_ids(backend, sheet_name) if replayed else None
+        if live is not None:
+            id_col = LINK_CONFIG_RAW[sheet_name]["ID_COL"]
+            records = [rec for rec in records if _revision_text(rec.get(id_col)) not in live or not _revision_text(rec.get(id_col))]
+            if not records:
+                return
+        backend.append_rows(sheet_name, pd.DataFrame(records).fillna(""))
+    elif kind == "update":
+        cells = payload["cells"]
+        positions = _resolve_rows(backend, sheet_name, [(c[0], c[1]) for c in cells])
+        backend.update_cells(sheet_name, [(pos, c[2], c[3]) for pos, c in zip(positions, cells)])
+    elif kind == "delete":
+        rows = payload["rows"]
+        live = _live_ids(backend, sheet_name) if replayed else None
+        if live is not None:
+            rows = [r for r in rows if r[0] is None or _revision_text(r[0]) in live]
+            if not rows:
+                return
+        backend.delete_rows(sheet_name, _resolve_rows(backend, sheet_name, [(r[0], r[1]) for r in rows]))
+    else:
+        raise ValueError(f"Lệnh ghi không hợp lệ: {kind}")
+
+def _overlay_write(sheet_name, df, kind, payload):
+    """
+    Áp 1 lệnh ghi chưa gửi lên bảng đã làm sạch trong bộ nhớ, để người dùng thấy ngay
+    thay đổi của mình trong lúc hàng đợi đang gửi nền. Lỗi -> giữ nguyên bảng.
     """
-    conn = get_conn()
     try:
-        df_save = df_new.copy()
-        
-        # Chuyển datetime về string 'YYYY-MM-DD' để lưu lên Sheet không bị lỗi
-        for col in df_save.columns:
-            if pd.api.types.is_datetime64_any_dtype(df_save[col]):
-                # Lưu dưới định dạng yyyy-mm-dd
-                df_save[col] = df_save[col].dt.strftime('%Y-%m-%d').fillna("")
-            df_save[col] = df_save[col].fillna("") # Thay NaN/None bằng chuỗi rỗng
-        
-        # Hàm update của st-gsheets tự động clear và ghi đè
-        conn.update(worksheet=sheet_name, data=df_save)
+        if kind == "overwrite":
+            raw = pd.DataFrame(payload["rows"], columns=payload["columns"])
+            return _clean_sheet(raw.replace("", float("nan")), sheet_name)
+        if kind == "append":
+            new_rows = _clean_sheet(pd.DataFrame(payload["records"]).replace("", float("nan")), sheet_name)
+            return pd.concat([df, new_rows], ignore_index=True)
+
+        keys = [(c[0], c[1]) for c in payload["cells"]] if kind == "update" else [(r[0], r[1]) for r in payload["rows"]]
+        id_col = LINK_CONFIG_RAW.get(sheet_name, {}).get("ID_COL")
+        if id_col in df.columns and all(key is not None for key, _ in keys):
+            first = {}
+            for i, val in enumerate(df[id_col].map(_revision_text)):
+                first.setdefault(val, i)
+            positions = [first.get(key) for key, _ in keys]
+        else:
+            positions = [pos if pos < len(df) else None for _, pos in keys]
+
+        df = df.copy()
+        if kind == "update":
+            for pos, cell in zip(positions, payload["cells"]):
+                if pos is None or cell[2] not in df.columns: continue
+                value = cell[3]
+                if pd.api.types.is_datetime64_any_dtype(df[cell[2]]):
+                    # Đọc chuỗi ngày theo DATE_SCHEMA (tránh pandas hiểu 06/03 là tháng 6)
+                    value = parse_date_series(pd.Series([value]), date_kind(cell[2]) or "date").iloc[0]
+                try:
+                    df.iloc[pos, df.columns.get_loc(cell[2])] = value
+                except Exception:
+                    df[cell[2]] = df[cell[2]].astype(object)
+                    df.iloc[pos, df.columns.get_loc(cell[2])] = value
+            return df
+        drop = [df.index[p] for p in positions if p is not None]
+        return df.drop(index=drop).reset_index(drop=True)
+    except Exception as e:
+        return df
+
+def _overlay_pending(sheet_name, df):
+    """Áp toàn bộ lệnh ghi còn chờ của sheet lên bảng vừa tải."""
+    if not WRITE_BEHIND:
+        return df
+    revision = df.attrs.get("revision")
+    for op in _get_queue().pending(sheet_name):
+        df = _overlay_write(sheet_name, df, op["kind"], op["payload"])
+    df.attrs["revision"] = revision # pd.concat không giữ attrs
+    return df
+
+@st.cache_resource
+def _get_queue():
+    """Hàng đợi ghi nền (khởi động luồng gửi 1 lần cho cả tiến trình)."""
+    queue = get_write_queue()
+    queue.start(_apply_write, on_flushed=_on_flushed, on_failed=invalidate_sheet)
+    return queue
+
+def _on_flushed(sheet_name, kind, payload, replayed=False):
+    """
+    Sau khi 1 lệnh đã lên Sheet. Thêm dòng: bảng trong cache đã có sẵn các dòng này (và nhật ký
+    thêm dòng đã ghi nhận từ lúc gửi) -> giữ nguyên để thống kê / chỉ mục chỉ xử lý phần dòng mới.
+    Sửa / xóa / ghi đè, hoặc lệnh chạy lại từ nhật ký (có thể đã bỏ bớt dòng) -> bỏ cache để tải dữ liệu thật.
+    """
+    if kind == "append" and not replayed:
+        return
+    invalidate_sheet(sheet_name)
+
+def _submit_write(sheet_name, kind, payload):
+    """
+    Ghi nền (WRITE_BEHIND): ghi nhật ký + cập nhật ngay bảng trong cache rồi trả về;
+    ngược lại ghi trực tiếp lên backend (thêm dòng thì nối vào cache, còn lại bỏ cache).
+    """
+    if not WRITE_BEHIND:
+        _apply_write(sheet_name, kind, payload)
+        if kind == "append":
+            _cache_write(sheet_name, kind, payload)
+        else:
+            invalidate_sheet(sheet_name)
         return True
-        
+
+    _get_queue().submit(sheet_name, kind, payload)
+    # Người dùng thấy ngay thay đổi của mình (dữ liệu thật sẽ được tải lại sau khi gửi xong)
+    _cache_write(sheet_name, kind, payload)
+    return True
+
+def _cache_write(sheet_name, kind, payload):
+    """
+    Áp 1 lệnh ghi lên bảng trong cache thay vì bỏ cache. Thêm dòng -> nối vào cuối (bảng đầy đủ
+    hoặc các bảng đã cắt cột) và ghi nhận vào nhật ký thêm dòng; không có gì để áp -> bỏ cache.
+    """
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        df = cache["data"].get(sheet_name)
+    if df is not None:
+        new_df = _overlay_write(sheet_name, df, kind, payload)
+        new_df.attrs["revision"] = df.attrs.get("revision")
+        with cache["lock"]:
+            before = cache["version"].get(sheet_name, 0)
+            unchanged = cache["data"].get(sheet_name) is df
+            loaded_at = cache["loaded_at"].get(sheet_name)
+            _set_cached(sheet_name, new_df)
+            if loaded_at is not None: # Vẫn tải lại theo TTL tính từ lần đọc thật gần nhất
+                cache["loaded_at"][sheet_name] = loaded_at
+            if kind == "append" and unchanged:
+                _log_append(sheet_name, before, len(df))
+            else:
+                cache["appends"].pop(sheet_name, None)
+    elif kind == "append" and _append_projected(sheet_name, payload):
+        pass # Chỉ có bảng đã cắt cột trong cache: đã nối dòng mới vào cuối các bảng đó
+    else:
+        invalidate_sheet(sheet_name) # Bỏ các bảng đã cắt cột để lần đọc sau thấy thay đổi
+
+def _log_append(sheet_name, before, n_rows):
+    """Ghi nhận sheet vừa chuyển từ version before sang version hiện tại chỉ bằng thêm dòng."""
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        log = cache["appends"].setdefault(sheet_name, [])
+        log.append((before, cache["version"][sheet_name], n_rows))
+        del log[:-APPEND_LOG_SIZE]
+
+def _append_projected(sheet_name, payload):
+    """
+    Nối các dòng vừa thêm vào cuối mọi bảng đã cắt cột (cùng version) của sheet rồi tăng version,
+    thay vì bỏ cache. Không có bảng nào / sheet vừa đổi -> False.
+    """
+    cache = _get_sheet_cache()
+    with cache["lock"]:
+        before = cache["version"].get(sheet_name, 0)
+        entries = {k: e for k, e in cache["projections"].items() if k[0] == sheet_name and e[0] == before}
+    if not entries:
+        return False
+    try:
+        new_rows = _clean_sheet(pd.DataFrame(payload["records"]).replace("", float("nan")), sheet_name)
+    except Exception:
+        return False
+
+    with cache["lock"]:
+        if cache["version"].get(sheet_name, 0) != before:
+            return False
+        for store in (cache["projections"], cache["indexes"], cache["dropdowns"]):
+            for key in [k for k in store if k[0] == sheet_name]:
+                del store[key]
+        after = before + 1
+        for key, (_, loaded_at, df) in entries.items():
+            cache["projections"][key] = (after, loaded_at, pd.concat([df, new_rows.reindex(columns=df.columns)], ignore_index=True))
+        cache["version"][sheet_name] = after
+        _log_append(sheet_name, before, len(next(iter(entries.values()))[2]))
+    return True
+
+def get_pending_writes():
+    """Trạng thái hàng đợi ghi: (số lệnh chờ gửi, lỗi gần nhất hoặc None)."""
+    if not WRITE_BEHIND:
+        return 0, None
+    queue = _get_queue()
+    return len(queue.pending()), queue.last_error
+
+def get_failed_writes():
+    """Các lệnh ghi đã bỏ cuộc sau WRITE_MAX_ATTEMPTS lần lỗi: list dict sheet, kind, count, error."""
+    if not WRITE_BEHIND:
+        return []
+    items = {"overwrite": "rows", "append": "records", "update": "cells", "delete": "rows"}
+    return [{
+        "sheet": op["sheet"], "kind": op["kind"], "error": op.get("error"),
+        "count": len(op["payload"].get(items.get(op["kind"]), [])),
+    } for op in _get_queue().failed_ops()]
+
+def discard_failed_write(index):
+    """Bỏ 1 lệnh ghi lỗi (theo thứ tự trong get_failed_writes)."""
+    _get_queue().discard_failed(index)
+
+def retry_failed_write(index):
+    """Gửi lại 1 lệnh ghi lỗi; thay đổi hiện lại ngay trên bảng trong lúc chờ gửi."""
+    queue = _get_queue()
+    failed = queue.failed_ops()
+    if 0 <= index < len(failed):
+        queue.retry_failed(index)
+        invalidate_sheet(failed[index]["sheet"])
+
+def flush_writes():
+    """Gửi ngay các lệnh ghi đang chờ (không đợi nhịp của luồng nền)."""
+    if WRITE_BEHIND:
+        _get_queue().flush()
+
+def _records(df_save):
+    """DataFrame đã chuẩn bị -> list dict giá trị JSON được (cho nhật ký hàng đợi)."""
+    return [{str(k): to_cell_value(v) for k, v in rec.items()} for rec in df_save.to_dict("records")]
+
+def _row_keys(sheet_name, df_old, labels):
+    """Khóa định vị dòng (id, vị trí lúc tải) cho các index của bảng gốc."""
+    order = {idx: pos for pos, idx in enumerate(df_old.index)}
+    id_col = LINK_CONFIG_RAW.get(sheet_name, {}).get("ID_COL")
+    keys = {}
+    for idx in labels:
+        key = None
+        if id_col in df_old.columns:
+            # Cùng cách chuẩn hóa với ID đọc từ Sheet (ID đọc thành số 1.0 -> "1")
+            key = _revision_text(df_old.at[idx, id_col]) or None
+        keys[idx] = (key, order[idx])
+    return keys
+
+# ---------------------------------------------------------
+# API ghi dùng trong các tab
+# ---------------------------------------------------------
+def save_raw_sheet(sheet_name, df_new, check_revision=True):
+    """
+    Ghi đè dữ liệu vào Sheet.
+    Nếu df_new mang mã phiên bản lúc tải (attrs["revision"]) mà Sheet đã bị người khác
+    thay đổi thì từ chối ghi (SheetConflictError) để không làm mất dữ liệu của họ.
+    """
+    if check_revision and not _check_revision(sheet_name, df_new)[0]:
+        raise SheetConflictError(f"Sheet {sheet_name} đã bị thay đổi bởi người khác. Vui lòng tải lại rồi sửa tiếp.")
+    try:
+        df_save = _prepare_for_sheet(df_new)
+        rows = [[to_cell_value(v) for v in row] for row in df_save.itertuples(index=False, name=None)]
+        return _submit_write(sheet_name, "overwrite", {"columns": [str(c) for c in df_save.columns], "rows": rows})
+
     except Exception as e:
         raise e
+
+def append_rows(sheet_name, rows):
+    """
+    Thêm dòng mới vào cuối Sheet, KHÔNG ghi lại dữ liệu cũ.
+    - rows: list[dict] hoặc DataFrame (tên cột dạng đã chuẩn hóa, VD: TEN_VIEC)
+    - Giá trị được sắp theo đúng thứ tự cột tiêu đề hiện có trên Sheet.
+    - Cột chưa có trên Sheet sẽ được thêm vào cuối dòng tiêu đề.
+    """
+    df_rows = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    if df_rows.empty:
+        return True
+    return _submit_write(sheet_name, "append", {"records": _records(_prepare_for_sheet(df_rows))})
+
+def update_cells(sheet_name, updates):
+    """
+    Chỉ ghi các ô thay đổi.
+    - updates: list (vị trí dòng dữ liệu 0-based, tên cột chuẩn hóa, giá trị mới)
+    """
+    if not updates:
+        return True
+    cells = [[None, int(pos), str(col), to_cell_value(val)] for pos, col, val in updates]
+    return _submit_write(sheet_name, "update", {"cells": cells})
+
+def delete_rows(sheet_name, row_positions):
+    """Xóa các dòng dữ liệu theo vị trí 0-based (không tính dòng tiêu đề)."""
+    if not row_positions:
+        return True
+    return _submit_write(sheet_name, "delete", {"rows": [[None, int(pos)] for pos in row_positions]})
+
+def save_sheet_diff(sheet_name, df_old, df_new):
+    """
+    Lưu bảng đã sửa bằng cách chỉ gửi phần thay đổi so với bảng gốc:
+    ô bị sửa (batch update), dòng bị xóa (batch delete), dòng mới (append).
+    Chỉ ghi đè toàn bộ khi tiêu đề cột thay đổi hoặc Sheet chưa có tiêu đề.
+
+    Kiểm soát ghi đồng thời: so mã phiên bản của df_old với Sheet hiện tại.
+    - Khớp: ghi luôn.
+    - Lệch: vẫn ghi (gộp) nếu mọi dòng bị sửa/xóa định vị được bằng ID còn tồn tại;
+      ngược lại (hoặc khi phải ghi đè toàn bộ) -> SheetConflictError.
+    Trả về dict thống kê: full, merged, changed, added, deleted.
+    """
+    diff = diff_frames(df_old, df_new)
+    summary = {"full": False, "merged": False, "changed": 0, "added": 0, "deleted": 0}
+
+    if diff is not None and not (diff["changed"] or diff["deleted"] or len(diff["added"])):
+        return summary
+
+    matched, live_ids = _check_revision(sheet_name, df_old)
+
+    header = [] if diff is None else get_backend().read_header(sheet_name)
+    if header and WRITE_BEHIND:
+        # Cột do các lệnh thêm dòng đang chờ gửi tạo ra cũng được tính là đã có
+        for op in _get_queue().pending(sheet_name):
+            if op["kind"] == "append":
+                header = header + [c for rec in op["payload"]["records"] for c in rec]
+    positions = header_positions(header)
+
+    conflict = SheetConflictError(f"Sheet {sheet_name} đã bị thay đổi bởi người khác. Vui lòng tải lại rồi sửa tiếp.")
+    if diff is None or not header or any(normalize_column_name(c) not in positions for c in df_new.columns):
+        if not matched:
+            raise conflict
+        save_raw_sheet(sheet_name, df_new, check_revision=False)
+        summary["full"] = True
+        return summary
+
+    keys = _row_keys(sheet_name, df_old, {idx for idx, _, _ in diff["changed"]} | set(diff["deleted"]))
+    if not matched:
+        # Chỉ gộp được khi định vị dòng bằng ID (cột khóa là cột ID) và ID vẫn còn trên Sheet
+        id_col = LINK_CONFIG_RAW.get(sheet_name, {}).get("ID_COL")
+        live = set(live_ids or [])
+        if _revision_column(sheet_name, df_old) != id_col or any(key is None or key not in live for key, _ in keys.values()):
+            raise conflict
+        summary["merged"] = True
+    if diff["changed"]:
+        cells = [[*keys[idx], str(col), to_cell_value(val)] for idx, col, val in diff["changed"]]
+        _submit_write(sheet_name, "update", {"cells": cells})
+    if diff["deleted"]:
+        _submit_write(sheet_name, "delete", {"rows": [list(keys[idx]) for idx in diff["deleted"]]})
+    if len(diff["added"]):
+        append_rows(sheet_name, diff["added"])
+
+    summary.update(changed=len(diff["changed"]), added=len(diff["added"]), deleted=len(diff["deleted"]))
+    return summary
@@ -38,6 +38,7 @@ def render_guide_tab():
         * Nhân sự (Ai làm gì?)
         * Dự án / Gói thầu / Hợp đồng (Tiến độ của dự án đó thế nào?)
         * Trạng thái (Việc nào đang cháy tiến độ?)
+    * **Xu hướng & burndown:** Mỗi ngày App tự chụp lại số việc theo trạng thái / người nhận / dự án vào sheet **12_LICH_SU** (tự tạo nếu chưa có, chỉ ghi phần thay đổi) để vẽ biểu đồ theo thời gian. Không cần sửa tay sheet này.
 
     ---
 
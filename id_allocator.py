@@ -0,0 +1,83 @@
+import re
+import threading
+import streamlit as st
+import pandas as pd
+from config import ID_SEQUENCES
+from gsheet import load_sheets, get_sheet_version, get_appended_since
+from storage import get_backend
+
+# =========================================================
+# 🔢 CẤP MÃ ID MỚI (CV001, CHAT001...)
+# =========================================================
+# Mỗi tiền tố có 1 "mốc cao nhất" đã cấp, giữ chung cho cả tiến trình (mọi phiên Streamlit).
+# Mốc được tăng ngay trong bộ nhớ rồi cấp tiếp k mã liên tiếp trong khóa -> 2 phiên của cùng
+# 1 tiến trình cùng bấm Lưu không bao giờ nhận trùng mã. Chỉ đối chiếu lại với cột ID trên Sheet
+# (1 lần đọc 1 cột) và bảng trong cache khi chưa có mốc hoặc version của sheet đã đổi;
+# nếu từ lần đối chiếu trước sheet chỉ được thêm dòng thì chỉ quét các dòng mới trong cache.
+# Giữa các tiến trình khác nhau (nhiều máy chủ / nhiều bản App) thì KHÔNG bảo đảm: khi bật
+# WRITE_BEHIND, mã đã cấp ở tiến trình kia còn nằm trong hàng đợi của nó ít nhất
+# WRITE_FLUSH_INTERVAL giây trước khi lên Sheet, nên 2 tiến trình vẫn có thể cấp trùng 1 mã.
+
+@st.cache_resource
+def _get_allocator_state():
+    """Khóa + mốc cao nhất đã cấp theo tiền tố: tiền tố -> (mốc, version của sheet lúc đối chiếu)."""
+    return {"lock": threading.Lock(), "marks": {}}
+
+def max_sequence(values, prefix):
+    """Số thứ tự lớn nhất trong các mã dạng <prefix><số> (cả cột 1 lần); không có -> 0."""
+    s = pd.Series(values, dtype=object).dropna().astype(str).str.strip()
+    nums = pd.to_numeric(s.str.extract(rf"^{re.escape(prefix)}(\d+)$", flags=re.IGNORECASE)[0], errors="coerce")
+    return int(nums.max()) if nums.notna().any() else 0
+
+def _current_max(prefix):
+    """Số lớn nhất hiện có: trên backend và trong cache (gồm lệnh ghi chưa gửi)."""
+    sheet_name, id_col, _ = ID_SEQUENCES[prefix]
+    found = 0
+    try:
+        found = max_sequence(get_backend().read_column(sheet_name, id_col), prefix)
+    except Exception as e:
+        print(f"Lỗi đọc cột {id_col} ({sheet_name}): {e}")
+    df = load_sheets([sheet_name], columns={sheet_name: [id_col]}).get(sheet_name, pd.DataFrame())
+    if id_col in df.columns:
+        found = max(found, max_sequence(df[id_col], prefix))
+    return found
+
+def _synced_mark(prefix, entry):
+    """Mốc hiện tại của tiền tố: giữ nguyên nếu sheet chưa đổi version, nếu không thì đối chiếu lại."""
+    sheet_name, id_col, _ = ID_SEQUENCES[prefix]
+    version = get_sheet_version(sheet_name)
+    if entry is None:
+        return _current_max(prefix), version
+    mark, synced = entry
+    if synced == version:
+        return mark, version
+    start = get_appended_since(sheet_name, synced)
+    if start is None:
+        return max(mark, _current_max(prefix)), version
+    # Chỉ có thêm dòng -> chỉ quét các dòng mới trong cache, không đọc lại backend
+    df = load_sheets([sheet_name], columns={sheet_name: [id_col]}).get(sheet_name, pd.DataFrame())
+    if id_col in df.columns:
+        mark = max(mark, max_sequence(df[id_col].iloc[start:], prefix))
+    return mark, version
+
+def reserve(prefix, k=1):
+    """
+    Giữ chỗ k mã liên tiếp cho tiền tố (khai báo trong config.ID_SEQUENCES).
+    VD: reserve("CV", 3) -> ["CV013", "CV014", "CV015"]. Mã đã cấp không cấp lại dù chưa được ghi
+    (trong cùng tiến trình; xem ghi chú đầu file về nhiều tiến trình).
+    """
+    if prefix not in ID_SEQUENCES:
+        raise KeyError(f"Chưa khai báo tiền tố ID: {prefix}")
+    if k <= 0:
+        return []
+    width = ID_SEQUENCES[prefix][2]
+    state = _get_allocator_state()
+    with state["lock"]:
+        mark, version = _synced_mark(prefix, state["marks"].get(prefix))
+        start = mark + 1
+        state["marks"][prefix] = (start + k - 1, version)
+    return [f"{prefix}{n:0{width}d}" for n in range(start, start + k)]
+
+def next_id(prefix):
+    """1 mã mới cho tiền tố."""
+    return reserve(prefix, 1)[0]
@@ -0,0 +1,59 @@
+import threading
+import streamlit as st
+from config import LINK_CONFIG_RAW
+from gsheet import load_sheets, sheet_columns, get_sheet_version, get_display_index
+from utils import map_display_multi
+
+# =========================================================
+# 🔗 BẢNG ĐÃ NỐI SẴN THEO LINK_CONFIG_RAW
+# =========================================================
+# Với mỗi cột liên kết (LINK_COLS) của 1 sheet, thêm cột <CỘT>_TEN chứa tên bên sheet đích
+# (NAME_COL). Ô nhiều ID ('NS01, NS02') được tra từng ID. Kết quả được giữ lại cho tới khi
+# sheet gốc hoặc 1 trong các sheet đích đổi version.
+
+def name_column(sheet_name):
+    """Cột tên ngắn của 1 sheet: NAME_COL, nếu không có thì cột hiển thị đầu tiên."""
+    cfg = LINK_CONFIG_RAW.get(sheet_name, {})
+    return cfg.get("NAME_COL") or (cfg.get("DISPLAY_COLS") or [None])[0]
+
+def link_columns(sheet_name, columns=None):
+    """Các cột liên kết của sheet (chỉ những cột có trong columns nếu truyền vào): cột -> sheet đích."""
+    links = LINK_CONFIG_RAW.get(sheet_name, {}).get("LINK_COLS", {})
+    return {col: target for col, (target, _) in links.items() if columns is None or col in columns}
+
+@st.cache_resource
+def _get_view_cache():
+    """(sheet_name, tuple cột) -> (tuple version các sheet liên quan, DataFrame đã nối)."""
+    return {"lock": threading.Lock(), "views": {}}
+
+def resolve_links(df, sheet_name):
+    """Thêm cột <CỘT>_TEN cho mọi cột liên kết có trong df (tra theo chỉ mục ID -> tên, cả cột 1 lần)."""
+    df = df.copy()
+    for col, target in link_columns(sheet_name, df.columns).items():
+        index = get_display_index(target, [name_column(target)])
+        df[col + "_TEN"] = map_display_multi(df[col], index).values
+    return df
+
+def get_linked_view(sheet_name, columns=None, copy=True):
+    """
+    Bảng của sheet_name (chỉ các cột columns nếu truyền vào) kèm các cột <CỘT>_TEN đã nối sẵn.
+    Dùng chung cho báo cáo / xuất file; chỉ dựng lại khi dữ liệu liên quan thay đổi.
+    copy=False: trả về chính bảng trong cache (chỉ để đọc; bảng mới là object khác khi dữ liệu đổi).
+    """
+    cols = tuple(columns) if columns else None
+    df = load_sheets([sheet_name], columns={sheet_name: cols} if cols else None)[sheet_name]
+
+    targets = sorted(set(link_columns(sheet_name, df.columns).values()))
+    # Tải song song các sheet đích (chỉ cột ID + tên), cùng cách cắt cột với get_display_index
+    load_sheets(targets, columns={t: sheet_columns(t) for t in targets})
+    versions = tuple(get_sheet_version(name) for name in [sheet_name, *targets])
+
+    cache = _get_view_cache()
+    key = (sheet_name, cols)
+    with cache["lock"]:
+        entry = cache["views"].get(key)
+    if entry is None or entry[0] != versions:
+        entry = (versions, resolve_links(df, sheet_name))
+        with cache["lock"]:
+            cache["views"][key] = entry
+    return entry[1].copy() if copy else entry[1]
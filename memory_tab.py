@@ -1,8 +1,7 @@
 import streamlit as st
-import pandas as pd
-from gsheet import load_all_sheets, save_raw_sheet
+from gsheet import load_sheets, get_sheet, append_rows
 # Module này chúng ta sẽ tạo ở Bước 2
-from gemini_memory_parser import parse_memory_from_chat 
+from gemini_memory_parser import parse_memory_from_chat, CONTEXT_SHEETS
 
 def render_memory_tab():
     st.header("🧠 Trí nhớ AI (Lưu trữ Tri thức)")
@@ -10,12 +9,10 @@ def render_memory_tab():
     # 1. Lấy API Key từ Secrets (Ưu tiên) hoặc Config
     api_key = st.secrets.get("general", {}).get("GEMINI_API_KEY", None)
 
-    all_sheets = load_all_sheets()
-    
     # Fallback: Tìm trong Sheet cấu hình nếu chưa có trong Secrets
     if not api_key:
         try:
-            df_config = all_sheets.get("8_CAU_HINH", pd.DataFrame())
+            df_config = get_sheet("8_CAU_HINH")
             if not df_config.empty:
                 # Logic tìm key linh hoạt
                 mask = df_config.iloc[:, 0].astype(str).str.contains("GEMINI_API", case=False, na=False)
@@ -38,8 +35,9 @@ def render_memory_tab():
     if st.button("🚀 Phân tích & Trích xuất", type="primary"):
         if user_message.strip():
             with st.spinner("Gemini đang đọc hiểu..."):
-                # Gọi hàm xử lý AI
-                df_parsed = parse_memory_from_chat(api_key, user_message)
+                # Gọi hàm xử lý AI (chỉ tải dữ liệu tham chiếu khi cần)
+                context_sheets = load_sheets(CONTEXT_SHEETS)
+                df_parsed = parse_memory_from_chat(api_key, user_message, context_sheets)
                 
                 if not df_parsed.empty:
                     st.session_state["memory_parsed"] = df_parsed
@@ -56,14 +54,8 @@ def render_memory_tab():
         
         if st.button("💾 Lưu vào Trí nhớ AI", type="primary"):
             try:
-                # Lấy dữ liệu cũ
-                df_mem = all_sheets.get("11_TRI_NHO_AI", pd.DataFrame())
-                
-                # Nối dữ liệu mới
-                df_new = pd.concat([df_mem, df_edit], ignore_index=True)
-                
-                # Lưu lên Google Sheet
-                save_raw_sheet("11_TRI_NHO_AI", df_new)
+                # Chỉ thêm các dòng mới lên Google Sheet
+                append_rows("11_TRI_NHO_AI", df_edit)
                 
                 st.success("✅ Đã lưu vào bộ nhớ dài hạn!")
                 del st.session_state["memory_parsed"] # Xóa state để reset
@@ -75,7 +67,7 @@ def render_memory_tab():
     st.divider()
     st.subheader("🗄️ Dữ liệu đã ghi nhớ")
     try:
-        df_mem = load_all_sheets().get("11_TRI_NHO_AI", pd.DataFrame())
+        df_mem = get_sheet("11_TRI_NHO_AI")
         if not df_mem.empty and "LOAI" in df_mem.columns:
             filters = ["Tất cả"] + list(df_mem["LOAI"].unique())
             loai_chon = st.selectbox("Lọc theo loại:", filters)
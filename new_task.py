@@ -1,48 +1,28 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from gsheet import load_all_sheets, save_raw_sheet
-from utils import get_display_list_multi, format_date_vn
-
-def generate_task_id(df):
-    """Tự động sinh ID mới: CV001 -> CV002"""
-    if df.empty or "ID_CONG_VIEC" not in df.columns:
-        return "CV001"
-    
-    # Lấy danh sách ID cũ
-    ids = df["ID_CONG_VIEC"].dropna().astype(str).tolist()
-    max_num = 0
-    for i in ids:
-        # Lọc lấy số từ chuỗi (CV001 -> 1)
-        clean_id = ''.join(filter(str.isdigit, i))
-        if clean_id:
-            try:
-                n = int(clean_id)
-                if n > max_num: max_num = n
-            except: pass
-            
-    return f"CV{max_num + 1:03d}"
+from gsheet import load_sheets, sheet_columns, get_display_list
+from config import TASK_STATUSES
+from utils import format_date_vn, format_date_value
+from task_store import insert_tasks
 
 def render_new_task_tab():
     st.header("📝 Giao việc thủ công (Chi tiết)")
 
     # 1. Tải dữ liệu nền
     try:
-        all_sheets = load_all_sheets()
-        df_cv = all_sheets.get("7_CONG_VIEC", pd.DataFrame())
-        df_ns = all_sheets.get("1_NHAN_SU", pd.DataFrame())
-        df_da = all_sheets.get("4_DU_AN", pd.DataFrame())
-        df_gt = all_sheets.get("5_GOI_THAU", pd.DataFrame())
-        df_hd = all_sheets.get("6_HOP_DONG", pd.DataFrame())
+        # Chỉ cần ID + cột hiển thị của các danh mục (ID công việc mới do id_allocator cấp)
+        lookup_sheets = ["1_NHAN_SU", "4_DU_AN", "5_GOI_THAU", "6_HOP_DONG"]
+        load_sheets(lookup_sheets, columns={name: sheet_columns(name) for name in lookup_sheets})
     except Exception as e:
         st.error(f"Lỗi tải dữ liệu: {e}")
         return
 
-    # Chuẩn bị danh sách chọn
-    list_ns, map_ns = get_display_list_multi(df_ns, "ID_NHAN_SU", ["HO_TEN"], "Chọn nhân sự...")
-    list_da, map_da = get_display_list_multi(df_da, "ID_DU_AN", ["TEN_DU_AN"], "Không thuộc dự án")
-    list_hd, map_hd = get_display_list_multi(df_hd, "ID_HOP_DONG", ["TEN_HD", "SO_HD"], "Không thuộc hợp đồng")
-    list_gt, map_gt = get_display_list_multi(df_gt, "ID_GOI_THAU", ["TEN_GOI_THAU"], "Không thuộc gói thầu")
+    # Chuẩn bị danh sách chọn (dựng sẵn theo version của sheet, không tính lại mỗi lần rerun)
+    list_ns, map_ns = get_display_list("1_NHAN_SU", "ID_NHAN_SU", ["HO_TEN"], "Chọn nhân sự...")
+    list_da, map_da = get_display_list("4_DU_AN", "ID_DU_AN", ["TEN_DU_AN"], "Không thuộc dự án")
+    list_hd, map_hd = get_display_list("6_HOP_DONG", "ID_HOP_DONG", ["TEN_HD", "SO_HD"], "Không thuộc hợp đồng")
+    list_gt, map_gt = get_display_list("5_GOI_THAU", "ID_GOI_THAU", ["TEN_GOI_THAU"], "Không thuộc gói thầu")
 
     # 2. Tạo Form nhập liệu
     with st.form("form_giao_viec_full"):
@@ -72,7 +52,7 @@ def render_new_task_tab():
         with col4:
             ngay_giao = st.date_input("Ngày giao", value=datetime.now())
             han_chot = st.date_input("Hạn chót", value=None)
-            trang_thai = st.selectbox("Trạng thái tổng", ["Chưa thực hiện", "Đang thực hiện", "Hoàn thành", "Tạm dừng"])
+            trang_thai = st.selectbox("Trạng thái tổng", TASK_STATUSES)
 
         # --- NHÓM 3: LIÊN KẾT (Dự án/Hợp đồng) ---
         st.subheader("3. Liên kết hồ sơ")
@@ -118,28 +98,12 @@ def render_new_task_tab():
             id_hd = map_hd.get(hd_display, "")
             id_gt = map_gt.get(gt_display, "")
 
-            # 3. Tạo row dữ liệu (ĐÚNG THỨ TỰ CỘT BẠN GỬI)
-            new_id = generate_task_id(df_cv)
-            
-            # Chuẩn hóa ngày
-            s_ngay_giao = ngay_giao.strftime("%d/%m/%Y") if ngay_giao else ""
-            s_han_chot = han_chot.strftime("%d/%m/%Y") if han_chot else ""
-
-            # Danh sách cột chuẩn (22 cột)
-            cols_chuan = [
-                "ID_CONG_VIEC", "TEN_VIEC", "NOI_DUNG", "LOAI_VIEC", "NGUON_GIAO_VIEC",
-                "NGUOI_GIAO", "NGUOI_NHAN", "NGAY_GIAO", "HAN_CHOT", "NGUOI_PHOI_HOP",
-                "TRANG_THAI_TONG", "TRANG_THAI_CHI_TIET", "NGAY_THUC_TE_XONG",
-                "IDVB_VAN_BAN", "IDHD_CV", "IDDA_CV", "IDGT_CV",
-                "VUONG_MAC", "DE_XUAT", "IDDV_CV", "GHI_CHU_CV", "EMAIL_BC_CV"
-            ]
-            
-            # Đảm bảo DataFrame đủ cột
-            for c in cols_chuan:
-                if c not in df_cv.columns: df_cv[c] = ""
+            # 3. Tạo row dữ liệu (ID do insert_tasks cấp, cột theo TASK_COLUMNS)
+            # Chuẩn hóa ngày (định dạng ghi chuẩn trong DATE_WRITE_FORMATS)
+            s_ngay_giao = format_date_value(ngay_giao, "NGAY_GIAO")
+            s_han_chot = format_date_value(han_chot, "HAN_CHOT")
 
             new_row = {
-                "ID_CONG_VIEC": new_id,
                 "TEN_VIEC": ten_viec,
                 "NOI_DUNG": noi_dung,
                 "LOAI_VIEC": loai_viec,
@@ -163,9 +127,11 @@ def render_new_task_tab():
                 "EMAIL_BC_CV": email_bc
             }
             
-            # 4. Lưu
-            df_new = pd.concat([df_cv, pd.DataFrame([new_row])], ignore_index=True)
-            save_raw_sheet("7_CONG_VIEC", df_new)
+            # 4. Lưu (chỉ thêm 1 dòng mới, không ghi lại toàn bộ sheet)
+            saved, issues = insert_tasks(pd.DataFrame([new_row]))
+            for issue in issues:
+                st.warning(issue)
+            new_id = saved["ID_CONG_VIEC"].iloc[0]
             
             st.success(f"🎉 Đã lưu công việc mới: **{new_id} - {ten_viec}**")
             st.cache_data.clear()
@@ -1,10 +1,44 @@
 import streamlit as st
 import pandas as pd
-import io
+import numpy as np
 from datetime import datetime
 
-from gsheet import load_all_sheets
-from utils import lookup_display, format_date_vn
+from config import DONE_STATUSES, TASK_STATUSES
+from gsheet import load_sheets, sheet_columns, get_display_index, get_display_list, get_sheet_version
+from filter_engine import get_filter_index
+from report_stats import get_task_stats, overdue_mask
+from status_history import TOTAL_GROUP, TOTAL_KEYS, record_snapshot, get_history_series
+from report_export import EXPORT_FORMATS, export_key, get_export, parquet_available, summarize
+from task_search import search_tasks
+from utils import format_date_column, map_display, id_text
+
+# Các cột của 7_CONG_VIEC mà báo cáo dùng (không tải NOI_DUNG, VUONG_MAC... rất dài)
+REPORT_CV_COLS = [
+    "ID_CONG_VIEC", "TEN_VIEC", "LOAI_VIEC",
+    "NGUOI_GIAO", "NGUOI_NHAN", "NGUOI_PHOI_HOP",
+    "NGAY_GIAO", "HAN_CHOT", "NGAY_THUC_TE_XONG", "TRANG_THAI_TONG",
+    "IDDA_CV", "IDGT_CV", "IDHD_CV",
+]
+# Các sheet danh mục được nối tên vào báo cáo
+REPORT_LOOKUP_SHEETS = ["1_NHAN_SU", "4_DU_AN", "5_GOI_THAU", "6_HOP_DONG"]
+
+
+# Cột hiển thị trong bảng / file xuất (theo thứ tự)
+REPORT_SHOW_COLS = [
+    "ID_CONG_VIEC", "TEN_VIEC",
+    "NGUOI_GIAO", "NGUOI_GIAO_TEN",
+    "NGUOI_NHAN", "NGUOI_NHAN_TEN",
+    "NGUOI_PHOI_HOP", "NGUOI_PHOI_HOP_TEN",
+    "NGAY_GIAO", "HAN_CHOT",
+    "TRANG_THAI_TONG", "TRE_HAN", "DU_AN", "GOI_THAU", "LOAI_VIEC"
+]
+# Cột hiển thị -> cột gốc dùng để sắp xếp
+SORT_SOURCES = {"DU_AN": "IDDA_CV_TEN", "GOI_THAU": "IDGT_CV_TEN"}
+SORT_RELEVANCE = "Mức độ phù hợp"
+PAGE_SIZES = [25, 50, 100, 200]
+HISTORY_RANGES = {"30 ngày": 30, "90 ngày": 90, "1 năm": 365, "Tất cả": None}
+HISTORY_TOP = 10 # Số người nhận / dự án nhiều việc nhất được vẽ trên biểu đồ xu hướng
+STYLE_LATE = 'background-color: #f8d7da; color: #721c24'
 
 
 def highlight_status(s):
@@ -18,16 +52,113 @@ def highlight_status(s):
     return ''
 
 
+def status_styles(status, late=None):
+    """
+    CSS cho cột TRANG_THAI_TONG: phân loại mỗi giá trị khác nhau 1 lần (highlight_status)
+    rồi gán cho cả cột theo mã category; việc trễ hạn (late) tô đỏ.
+    """
+    cat = status.astype("category")
+    # Thêm "" ở cuối: ô trống có mã -1 -> lấy phần tử cuối
+    styles = np.array([highlight_status(c) for c in cat.cat.categories] + [""], dtype=object)
+    css = pd.Series(styles[cat.cat.codes.to_numpy()], index=status.index)
+    if late is not None:
+        css[late.to_numpy()] = STYLE_LATE
+    return css
+
+
+def prepare_show(df, late):
+    """Bảng hiển thị: cột trễ hạn, tên trống -> '-', ngày dd/mm/yyyy."""
+    df_show = df.copy()
+    df_show["TRE_HAN"] = late.map({True: "⚠️ Trễ hạn", False: ""})
+    for col in ["NGUOI_GIAO_TEN", "NGUOI_NHAN_TEN", "NGUOI_PHOI_HOP_TEN"]:
+        if col in df_show.columns:
+            df_show[col] = df_show[col].replace("", "-")
+    for col, src in SORT_SOURCES.items():
+        if src in df_show.columns:
+            df_show[col] = df_show[src].replace("", "-")
+    for col in ["HAN_CHOT", "NGAY_GIAO"]:
+        if col in df_show.columns:
+            df_show[col] = format_date_column(df_show[col])
+    return df_show
+
+
+def _named_counts(counts, index):
+    """Đổi khóa ID của bảng đếm sang tên (cùng tên thì cộng lại), sắp giảm dần."""
+    if counts.empty:
+        return counts
+    names = map_display(pd.Series(counts.index), index).values
+    return counts.groupby(names).sum().sort_values(ascending=False)
+
+
+def render_summary(stats):
+    """Bảng tổng hợp nhanh phía trên danh sách (số liệu của toàn bộ sheet, không theo bộ lọc)."""
+    ns_index = get_display_index("1_NHAN_SU", ["HO_TEN"])
+    da_index = get_display_index("4_DU_AN", ["TEN_DU_AN"])
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Tổng số công việc", stats["total"])
+    col2.metric("Đã hoàn thành", int(stats["status"].reindex(DONE_STATUSES).fillna(0).sum()))
+    col3.metric("Trễ hạn", stats["overdue"])
+
+    tab1, tab2, tab3, tab4 = st.tabs(["Theo trạng thái", "Theo người nhận", "Theo dự án", "Trễ hạn theo người"])
+    with tab1:
+        st.bar_chart(stats["status"].rename("Số việc"))
+    with tab2:
+        st.bar_chart(_named_counts(stats["person"], ns_index).rename("Số việc"))
+    with tab3:
+        st.bar_chart(_named_counts(stats["project"], da_index).rename("Số việc"))
+    with tab4:
+        if stats["overdue_person"].empty:
+            st.success("Không có công việc trễ hạn.")
+        else:
+            st.bar_chart(_named_counts(stats["overdue_person"], ns_index).rename("Số việc trễ"))
+
+
+def _named_columns(frame, index, top=HISTORY_TOP):
+    """Đổi cột ID của chuỗi theo ngày sang tên (cùng tên thì cộng lại), giữ top cột nhiều việc nhất ở ngày cuối."""
+    if frame.empty:
+        return frame
+    names = map_display(pd.Series(frame.columns), index).values
+    named = frame.T.groupby(names).sum().T
+    return named[named.iloc[-1].sort_values(ascending=False).index[:top]]
+
+
+def render_history(series):
+    """Biểu đồ xu hướng / burndown từ lịch sử chụp theo ngày (status_history), không đọc lại 7_CONG_VIEC."""
+    if series.empty:
+        st.info("Chưa có lịch sử. Số liệu được chụp lại mỗi ngày khi mở báo cáo.")
+        return
+
+    days = HISTORY_RANGES[st.selectbox("Khoảng thời gian", list(HISTORY_RANGES), key="report_history_range")]
+    if days is not None:
+        series = series.loc[series.index >= series.index.max() - pd.Timedelta(days=days - 1)]
+
+    def group(name):
+        return series[name] if name in series.columns.get_level_values(0) else pd.DataFrame(index=series.index)
+
+    tab1, tab2, tab3, tab4 = st.tabs(["Burndown", "Theo trạng thái", "Theo người nhận", "Theo dự án"])
+    with tab1:
+        totals = group(TOTAL_GROUP).reindex(columns=list(TOTAL_KEYS)).fillna(0).rename(columns=TOTAL_KEYS)
+        st.line_chart(totals)
+    with tab2:
+        status = group("TRANG_THAI_TONG")
+        order = [s for s in TASK_STATUSES if s in status.columns] + [s for s in status.columns if s not in TASK_STATUSES]
+        st.line_chart(status[order])
+    with tab3:
+        st.line_chart(_named_columns(group("NGUOI_NHAN"), get_display_index("1_NHAN_SU", ["HO_TEN"])))
+    with tab4:
+        st.line_chart(_named_columns(group("IDDA_CV"), get_display_index("4_DU_AN", ["TEN_DU_AN"])))
+
+
 def render_report_tab():
     st.header("📊 Báo cáo công việc")
 
     try:
-        all_sheets = load_all_sheets()
-        df_cv = all_sheets.get("7_CONG_VIEC", pd.DataFrame()).copy()
-        df_ns = all_sheets.get("1_NHAN_SU", pd.DataFrame()).copy()
-        df_da = all_sheets.get("4_DU_AN", pd.DataFrame()).copy()
-        df_gt = all_sheets.get("5_GOI_THAU", pd.DataFrame()).copy()
-        df_hd = all_sheets.get("6_HOP_DONG", pd.DataFrame()).copy()
+        columns = {name: sheet_columns(name) for name in REPORT_LOOKUP_SHEETS}
+        columns["7_CONG_VIEC"] = REPORT_CV_COLS
+        load_sheets(["7_CONG_VIEC"] + REPORT_LOOKUP_SHEETS, columns=columns) # Tải song song 1 lượt
+        # Công việc kèm sẵn các cột <CỘT>_TEN + chỉ mục lọc (bảng dùng chung, chỉ đọc)
+        df_cv, fidx = get_filter_index("7_CONG_VIEC", REPORT_CV_COLS)
     except Exception as e:
         st.error(f"Lỗi tải dữ liệu: {e}")
         return
@@ -40,6 +171,13 @@ def render_report_tab():
         st.error("Không tìm thấy cột 'TRANG_THAI_TONG' trong sheet 7_CONG_VIEC.")
         return
 
+    with st.expander("📈 Tổng hợp", expanded=True):
+        render_summary(get_task_stats())
+
+    record_snapshot() # Chụp số liệu hôm nay vào lịch sử (tối đa 1 lần / HISTORY_INTERVAL, chỉ ghi phần thay đổi)
+    with st.expander("📉 Xu hướng & burndown", expanded=False):
+        render_history(get_history_series())
+
     with st.expander("🔍 Bộ lọc nâng cao", expanded=True):
         colA, colB = st.columns(2)
         date_from = colA.date_input("Từ ngày (NGAY_GIAO)", None)
@@ -48,60 +186,41 @@ def render_report_tab():
         col1, col2, col3 = st.columns(3)
         col4, col5, col6 = st.columns(3)
 
-        da_map = dict(zip(df_da["ID_DU_AN"], df_da["TEN_DU_AN"])) if "ID_DU_AN" in df_da.columns else {}
-        list_da = ["Tất cả"] + list(da_map.values())
-
-        gt_map = dict(zip(df_gt["ID_GOI_THAU"], df_gt["TEN_GOI_THAU"])) if "ID_GOI_THAU" in df_gt.columns else {}
-        list_gt = ["Tất cả"] + list(gt_map.values())
+        # Danh sách chọn 'ID | Tên' + map ngược về ID (lọc thẳng theo mã, không dò ngược tên)
+        list_da, map_da = get_display_list("4_DU_AN", "ID_DU_AN", ["TEN_DU_AN"], "Tất cả")
+        list_gt, map_gt = get_display_list("5_GOI_THAU", "ID_GOI_THAU", ["TEN_GOI_THAU"], "Tất cả")
+        list_hd, map_hd = get_display_list("6_HOP_DONG", "ID_HOP_DONG", ["TEN_HD"], "Tất cả")
 
-        hd_map = dict(zip(df_hd["ID_HOP_DONG"], df_hd["TEN_HD"])) if "ID_HOP_DONG" in df_hd.columns else {}
-        list_hd = ["Tất cả"] + list(hd_map.values())
-
-        search_ten = col1.text_input("Tên công việc (Từ khóa)", "")
+        search_ten = col1.text_input("Từ khóa (tên, nội dung, ghi chú, vướng mắc)", "", placeholder="VD: hop dong")
         filter_da = col2.selectbox("Dự án", list_da)
         filter_gt = col3.selectbox("Gói thầu", list_gt)
         filter_hd = col4.selectbox("Hợp đồng", list_hd)
 
-        list_loai = ["Tất cả"] + list(df_cv["LOAI_VIEC"].dropna().unique()) if "LOAI_VIEC" in df_cv.columns else ["Tất cả"]
-        filter_loai = col5.selectbox("Loại việc", list_loai)
-
-        list_tt = ["Tất cả"] + sorted(df_cv["TRANG_THAI_TONG"].dropna().astype(str).str.strip().unique())
-        filter_tt = col6.selectbox("Trạng thái", list_tt)
-
-    df_filtered = df_cv.copy()
-
-    if "NGAY_GIAO" in df_filtered.columns:
-        if date_from:
-            df_filtered = df_filtered[df_filtered["NGAY_GIAO"] >= pd.to_datetime(date_from)]
-        if date_to:
-            df_filtered = df_filtered[df_filtered["NGAY_GIAO"] <= pd.to_datetime(date_to)]
-
-    if search_ten and "TEN_VIEC" in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered["TEN_VIEC"].astype(str).str.contains(search_ten, case=False, na=False)]
-
-    def find_id(map_dict, value):
-        return [k for k, v in map_dict.items() if v == value]
-
-    if filter_da != "Tất cả" and "IDDA_CV" in df_filtered.columns:
-        ids = find_id(da_map, filter_da)
-        if ids:
-            df_filtered = df_filtered[df_filtered["IDDA_CV"] == ids[0]]
-
-    if filter_gt != "Tất cả" and "IDGT_CV" in df_filtered.columns:
-        ids = find_id(gt_map, filter_gt)
-        if ids:
-            df_filtered = df_filtered[df_filtered["IDGT_CV"] == ids[0]]
-
-    if filter_hd != "Tất cả" and "IDHD_CV" in df_filtered.columns:
-        ids = find_id(hd_map, filter_hd)
-        if ids:
-            df_filtered = df_filtered[df_filtered["IDHD_CV"] == ids[0]]
-
-    if filter_loai != "Tất cả" and "LOAI_VIEC" in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered["LOAI_VIEC"] == filter_loai]
-
-    if filter_tt != "Tất cả":
-        df_filtered = df_filtered[df_filtered["TRANG_THAI_TONG"].astype(str).str.strip() == filter_tt]
+        filter_loai = col5.selectbox("Loại việc", ["Tất cả"] + fidx.values("LOAI_VIEC"))
+        filter_tt = col6.selectbox("Trạng thái", ["Tất cả"] + sorted(fidx.values("TRANG_THAI_TONG")))
+
+    # Giao các điều kiện trên chỉ mục rồi cắt bảng 1 lần
+    conditions = {
+        "NGAY_GIAO": (date_from, date_to),
+        "IDDA_CV": str(map_da.get(filter_da, "")).strip(),
+        "IDGT_CV": str(map_gt.get(filter_gt, "")).strip(),
+        "IDHD_CV": str(map_hd.get(filter_hd, "")).strip(),
+        "LOAI_VIEC": None if filter_loai == "Tất cả" else filter_loai,
+        "TRANG_THAI_TONG": None if filter_tt == "Tất cả" else filter_tt,
+    }
+    conditions = {col: cond for col, cond in conditions.items() if col in fidx.keys or col in fidx.dates}
+
+    ranked = None
+    if search_ten.strip() and "ID_CONG_VIEC" in fidx.keys:
+        # Tìm không dấu, khớp tiền tố trên tên / nội dung / ghi chú / vướng mắc
+        ranked = search_tasks(search_ten)
+    rows = None if ranked is None else fidx.rows_for("ID_CONG_VIEC", ranked)
+    df_filtered = df_cv.iloc[fidx.query(conditions, rows=rows)]
+
+    relevance = None
+    if ranked is not None:
+        rank = pd.Series(range(len(ranked)), index=ranked, dtype="int64")
+        relevance = id_text(df_filtered["ID_CONG_VIEC"]).map(rank)
 
     st.markdown(f"**Tìm thấy: {len(df_filtered)} công việc**")
 
@@ -109,52 +228,67 @@ def render_report_tab():
         st.info("Không có dữ liệu phù hợp.")
         return
 
-    df_show = df_filtered.copy()
-
-    def map_nhan_su(ma):
-        if pd.isna(ma) or ma is None:
-            return "-"
-        return lookup_display(ma, df_ns, "ID_NHAN_SU", ["HO_TEN"]) or "-"
-
-    for col in ["NGUOI_GIAO", "NGUOI_NHAN", "NGUOI_PHOI_HOP"]:
-        if col in df_show.columns:
-            df_show[col + "_TEN"] = df_show[col].apply(map_nhan_su)
-
-    if "IDDA_CV" in df_show.columns:
-        df_show["DU_AN"] = df_show["IDDA_CV"].map(da_map).fillna("-")
-    if "IDGT_CV" in df_show.columns:
-        df_show["GOI_THAU"] = df_show["IDGT_CV"].map(gt_map).fillna("-")
-
-    if "HAN_CHOT" in df_show.columns:
-        df_show["HAN_CHOT"] = df_show["HAN_CHOT"].apply(lambda x: format_date_vn(x) if pd.notnull(x) else "-")
-    if "NGAY_GIAO" in df_show.columns:
-        df_show["NGAY_GIAO"] = df_show["NGAY_GIAO"].apply(lambda x: format_date_vn(x) if pd.notnull(x) else "-")
-
-    desired_cols = [
-        "ID_CONG_VIEC", "TEN_VIEC",
-        "NGUOI_GIAO", "NGUOI_GIAO_TEN",
-        "NGUOI_NHAN", "NGUOI_NHAN_TEN",
-        "NGUOI_PHOI_HOP", "NGUOI_PHOI_HOP_TEN",
-        "NGAY_GIAO", "HAN_CHOT",
-        "TRANG_THAI_TONG", "DU_AN", "GOI_THAU", "LOAI_VIEC"
-    ]
-    final_cols = [c for c in desired_cols if c in df_show.columns]
-
-    excel_buffer = io.BytesIO()
-    with pd.ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
-        df_show[final_cols].to_excel(writer, index=False, sheet_name="BaoCao")
-
-    excel_buffer.seek(0)
-
-    st.download_button(
-        label="📥 Tải Excel",
-        data=excel_buffer,
-        file_name="bao_cao_cong_viec.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
+    late = overdue_mask(df_filtered)
+    done = df_filtered["TRANG_THAI_TONG"].astype("string").str.strip().isin(DONE_STATUSES).fillna(False)
+
+    # Xuất file: chỉ tạo khi bấm nút; cùng bộ lọc + cùng dữ liệu thì dùng lại file đã tạo
+    filter_state = (date_from, date_to, search_ten, filter_da, filter_gt, filter_hd, filter_loai, filter_tt)
+    versions = tuple(get_sheet_version(name) for name in ["7_CONG_VIEC", *REPORT_LOOKUP_SHEETS])
+    key = export_key(filter_state, versions)
+
+    def build_sheets():
+        df_show = prepare_show(df_filtered, late)
+        sheets = {"BaoCao": df_show[[c for c in REPORT_SHOW_COLS if c in df_show.columns]]}
+        if "NGUOI_NHAN_TEN" in df_show.columns:
+            sheets["TheoNguoi"] = summarize(df_show, "NGUOI_NHAN_TEN", done, late)
+        if "DU_AN" in df_show.columns:
+            sheets["TheoDuAn"] = summarize(df_show, "DU_AN", done, late)
+        return sheets
+
+    formats = [f for f in EXPORT_FORMATS if EXPORT_FORMATS[f][0] != "parquet" or parquet_available()]
+    col_fmt, col_btn = st.columns([3, 1])
+    fmt_label = col_fmt.radio("Định dạng file", formats, horizontal=True)
+    fmt, mime = EXPORT_FORMATS[fmt_label]
+    if col_btn.button("📦 Tạo file"):
+        get_export(key, fmt, build_sheets)
+        st.session_state["report_export"] = (key, fmt)
+
+    if st.session_state.get("report_export") == (key, fmt):
+        st.download_button(
+            label=f"📥 Tải {fmt_label}",
+            data=get_export(key, fmt, build_sheets),
+            file_name=f"bao_cao_cong_viec.{fmt}",
+            mime=mime
+        )
+
+    # Sắp xếp cả bảng theo cột gốc (ngày là datetime, chưa đổi sang chữ), rồi chỉ hiển thị 1 trang
+    sort_options = [c for c in REPORT_SHOW_COLS if c == "TRE_HAN" or SORT_SOURCES.get(c, c) in df_filtered.columns]
+    if relevance is not None:
+        sort_options.insert(0, SORT_RELEVANCE) # Đang tìm kiếm: mặc định xếp theo mức phù hợp
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    sort_col = col1.selectbox("Sắp xếp theo", sort_options,
+                              index=0 if relevance is not None or "HAN_CHOT" not in sort_options else sort_options.index("HAN_CHOT"))
+    ascending = col2.toggle("Tăng dần", value=True)
+    page_size = col3.selectbox("Số dòng / trang", PAGE_SIZES, index=1)
+    n_pages = max(1, -(-len(df_filtered) // page_size))
+    page = col4.number_input(f"Trang (/{n_pages})", min_value=1, max_value=n_pages, value=1, step=1)
+
+    if sort_col == SORT_RELEVANCE:
+        sort_key = relevance
+    elif sort_col == "TRE_HAN":
+        sort_key = late
+    else:
+        sort_key = df_filtered[SORT_SOURCES.get(sort_col, sort_col)]
+    order = sort_key.sort_values(ascending=ascending, na_position="last", kind="stable").index
+    page_index = order[(page - 1) * page_size: page * page_size]
+
+    # Chỉ trang đang xem mới được định dạng + tô màu
+    df_page = prepare_show(df_filtered.loc[page_index], late.loc[page_index])
+    page_cols = [c for c in REPORT_SHOW_COLS if c in df_page.columns]
+    css = status_styles(df_filtered["TRANG_THAI_TONG"].loc[page_index], late.loc[page_index]).to_numpy()
     st.dataframe(
-        df_show[final_cols].style.applymap(highlight_status, subset=['TRANG_THAI_TONG']),
+        df_page[page_cols].style.apply(lambda _: css, subset=["TRANG_THAI_TONG"]),
         use_container_width=True,
         hide_index=True
     )
+    st.caption(f"Trang {page}/{n_pages} · dòng {(page - 1) * page_size + 1}–{min(page * page_size, len(df_filtered))} / {len(df_filtered)}")
@@ -0,0 +1,95 @@
+import io
+import hashlib
+import importlib.util
+import threading
+from collections import OrderedDict
+import streamlit as st
+import pandas as pd
+import xlsxwriter
+
+# =========================================================
+# 📥 XUẤT BÁO CÁO (EXCEL / CSV / PARQUET)
+# =========================================================
+# File chỉ được tạo khi người dùng bấm "Tạo file", rồi giữ lại theo (bộ lọc, version dữ liệu,
+# định dạng): bấm lại với cùng bộ lọc không phải tạo lại. Excel ghi từng dòng ở chế độ
+# constant_memory của xlsxwriter (không giữ cả bảng tính trong RAM khi xuất hàng chục nghìn dòng).
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV (.csv)": ("csv", "text/csv"),
+    "Parquet (.parquet)": ("parquet", "application/octet-stream"),
+}
+EXPORT_CACHE_SIZE = 8 # Số file gần nhất được giữ lại (dùng chung mọi phiên)
+EMPTY_GROUP = "(Chưa có)"
+
+def parquet_available():
+    """Parquet cần pyarrow (không bắt buộc trong requirements)."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+def export_key(*parts):
+    """Khóa cache của 1 file xuất: băm các giá trị bộ lọc + version các sheet."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+def summarize(df, by, done=None, late=None):
+    """
+    Bảng tổng hợp theo cột by: số việc, số đã xong, số trễ hạn (done / late: Series bool cùng index).
+    Ô trống -> EMPTY_GROUP. Sắp theo số việc giảm dần.
+    """
+    groups = df[by].astype("string").str.strip().replace({"": EMPTY_GROUP, "-": EMPTY_GROUP}).fillna(EMPTY_GROUP)
+    flags = pd.DataFrame({
+        "SO_VIEC": 1,
+        "DA_XONG": pd.Series(False, index=df.index) if done is None else done,
+        "TRE_HAN": pd.Series(False, index=df.index) if late is None else late,
+    }, index=df.index).astype(int)
+    out = flags.groupby(groups.values).sum().sort_values("SO_VIEC", ascending=False)
+    return out.rename_axis(by).reset_index()
+
+def _cell_values(df):
+    """Bảng giá trị ghi được vào ô Excel (cả bảng 1 lần): ô trống / NaN -> None."""
+    return df.astype(object).where(df.notna(), None)
+
+def to_xlsx(sheets):
+    """Ghi nhiều bảng (tên sheet -> DataFrame) ra 1 file xlsx, từng dòng theo thứ tự (constant_memory)."""
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+    header = workbook.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
+    for name, df in sheets.items():
+        ws = workbook.add_worksheet(name[:31])
+        ws.write_row(0, 0, [str(c) for c in df.columns], header)
+        ws.freeze_panes(1, 0)
+        for r, row in enumerate(_cell_values(df).itertuples(index=False, name=None), start=1):
+            ws.write_row(r, 0, row)
+    workbook.close()
+    return buffer.getvalue()
+
+def to_bytes(sheets, fmt):
+    """Nội dung file theo định dạng ('xlsx' | 'csv' | 'parquet'). CSV / Parquet chỉ gồm bảng đầu tiên."""
+    if fmt == "xlsx":
+        return to_xlsx(sheets)
+    df = next(iter(sheets.values()))
+    if fmt == "csv":
+        return df.to_csv(index=False).encode("utf-8-sig") # Có BOM để Excel đọc đúng tiếng Việt
+    if fmt == "parquet":
+        buffer = io.BytesIO()
+        df.astype({c: "string" for c in df.columns if df[c].dtype == object}).to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    raise ValueError(f"Định dạng xuất không hỗ trợ: {fmt}")
+
+@st.cache_resource
+def _get_export_cache():
+    """(khóa, định dạng) -> bytes của các file xuất gần nhất."""
+    return {"lock": threading.Lock(), "files": OrderedDict()}
+
+def get_export(key, fmt, build_sheets):
+    """Bytes của file xuất: lấy lại nếu đã tạo với cùng khóa, không thì gọi build_sheets() để tạo."""
+    cache = _get_export_cache()
+    with cache["lock"]:
+        data = cache["files"].get((key, fmt))
+        if data is not None:
+            cache["files"].move_to_end((key, fmt))
+            return data
+    data = to_bytes(build_sheets(), fmt)
+    with cache["lock"]:
+        cache["files"][(key, fmt)] = data
+        while len(cache["files"]) > EXPORT_CACHE_SIZE:
+            cache["files"].popitem(last=False)
+    return data
@@ -0,0 +1,88 @@
+import threading
+from datetime import date
+import streamlit as st
+import pandas as pd
+from config import DONE_STATUSES
+from gsheet import load_sheets, get_sheet_version, get_appended_since
+from utils import id_text, parse_date_series
+
+# =========================================================
+# 📈 SỐ LIỆU TỔNG HỢP CÔNG VIỆC (cộng dồn khi thêm dòng)
+# =========================================================
+# Đếm theo trạng thái / người nhận / dự án + trễ hạn theo người nhận.
+# Giữ 1 bản theo version của 7_CONG_VIEC: nếu từ lần trước sheet chỉ được thêm dòng
+# (get_appended_since) thì chỉ đếm các dòng mới rồi cộng vào, không đếm lại cả bảng.
+# Sang ngày mới thì tính lại từ đầu (việc trễ hạn phụ thuộc ngày hôm nay).
+STATS_SHEET = "7_CONG_VIEC"
+STATS_CV_COLS = ["ID_CONG_VIEC", "TRANG_THAI_TONG", "NGUOI_NHAN", "IDDA_CV", "HAN_CHOT", "NGAY_THUC_TE_XONG"]
+STATS_GROUPS = {"status": "TRANG_THAI_TONG", "person": "NGUOI_NHAN", "project": "IDDA_CV"}
+EMPTY_KEY = "(Chưa có)"
+
+def overdue_mask(df, today=None):
+    """Việc trễ hạn: HAN_CHOT trước hôm nay, chưa có NGAY_THUC_TE_XONG và trạng thái chưa xong."""
+    if df.empty or "HAN_CHOT" not in df.columns:
+        return pd.Series(False, index=df.index)
+    today = pd.Timestamp(today or date.today()).normalize()
+    deadline = parse_date_series(df["HAN_CHOT"], "date")
+    late = deadline.notna() & (deadline < today)
+    if "NGAY_THUC_TE_XONG" in df.columns:
+        late &= parse_date_series(df["NGAY_THUC_TE_XONG"], "date").isna()
+    if "TRANG_THAI_TONG" in df.columns:
+        late &= ~df["TRANG_THAI_TONG"].astype("string").str.strip().isin(DONE_STATUSES).fillna(False)
+    return late
+
+def _group_keys(df, col):
+    """Giá trị nhóm của 1 cột (ô trống -> EMPTY_KEY)."""
+    if col not in df.columns:
+        return pd.Series(EMPTY_KEY, index=df.index, dtype=object)
+    return id_text(df[col]).replace("", EMPTY_KEY).set_axis(df.index)
+
+def compute_stats(df, today=None):
+    """Đếm 1 bảng công việc từ đầu: tổng, số trễ hạn và số việc theo từng nhóm trong STATS_GROUPS."""
+    late = overdue_mask(df, today)
+    stats = {"total": len(df), "overdue": int(late.sum())}
+    for name, col in STATS_GROUPS.items():
+        stats[name] = _group_keys(df, col).value_counts()
+    stats["overdue_person"] = _group_keys(df, "NGUOI_NHAN")[late].value_counts()
+    return stats
+
+def merge_stats(base, extra):
+    """Cộng số liệu của các dòng mới (extra) vào số liệu đã có (base)."""
+    merged = {"total": base["total"] + extra["total"], "overdue": base["overdue"] + extra["overdue"]}
+    for name in [*STATS_GROUPS, "overdue_person"]:
+        merged[name] = base[name].add(extra[name], fill_value=0).astype(int).sort_values(ascending=False)
+    return merged
+
+@st.cache_resource
+def _get_stats_cache():
+    """Bản số liệu gần nhất: (version 7_CONG_VIEC, ngày tính, số dòng, stats)."""
+    return {"lock": threading.Lock(), "entry": None}
+
+def get_task_stats(today=None):
+    """
+    Số liệu tổng hợp của toàn bộ 7_CONG_VIEC (dict: total, overdue, status, person, project,
+    overdue_person; mỗi nhóm là Series giá trị -> số việc). Không được sửa kết quả trả về.
+    """
+    today = pd.Timestamp(today or date.today()).normalize()
+    version = get_sheet_version(STATS_SHEET)
+    df = load_sheets([STATS_SHEET], columns={STATS_SHEET: STATS_CV_COLS})[STATS_SHEET]
+    loaded_version = get_sheet_version(STATS_SHEET)
+
+    cache = _get_stats_cache()
+    with cache["lock"]:
+        entry = cache["entry"]
+    if entry is not None and entry[0] == loaded_version and entry[1] == today:
+        return entry[3]
+
+    start = None
+    if entry is not None and entry[1] == today:
+        start = get_appended_since(STATS_SHEET, entry[0])
+    if start is not None and start == entry[2] and start <= len(df):
+        stats = merge_stats(entry[3], compute_stats(df.iloc[start:], today))
+    else:
+        stats = compute_stats(df, today)
+
+    if version == loaded_version: # Sheet không đổi trong lúc đọc -> số liệu khớp version
+        with cache["lock"]:
+            cache["entry"] = (loaded_version, today, len(df), stats)
+    return stats
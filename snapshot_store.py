@@ -0,0 +1,63 @@
+import os
+import json
+import time
+import pandas as pd
+from config import LOCAL_CACHE_DIR
+
+# =========================================================
+# 💽 BẢN CHỤP CỤC BỘ CÁC SHEET (Parquet + thời điểm tải)
+# =========================================================
+SNAPSHOT_DIR = os.path.join(LOCAL_CACHE_DIR, "snapshots")
+
+def _paths(sheet_name):
+    base = os.path.join(SNAPSHOT_DIR, sheet_name)
+    return base + ".parquet", base + ".json"
+
+def _arrow_safe(df):
+    """Cột object lẫn kiểu (số + chữ) không ghi được Parquet -> đổi giá trị sang chuỗi, giữ ô trống."""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def save_snapshot(sheet_name, df, fetched_at=None):
+    """Ghi bản chụp 1 sheet ra đĩa (ghi file tạm rồi đổi tên để không bị hỏng giữa chừng)."""
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    data_path, meta_path = _paths(sheet_name)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        try:
+            df.to_parquet(data_path + ".tmp", index=False)
+        except Exception:
+            _arrow_safe(df).to_parquet(data_path + ".tmp", index=False)
+        os.replace(data_path + ".tmp", data_path)
+
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"sheet": sheet_name, "fetched_at": fetched_at, "rows": len(df),
+                       "revision": df.attrs.get("revision")}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        return True
+    except Exception as e:
+        # Lưu tạm chỉ để tăng tốc, lỗi không được làm hỏng luồng chính
+        print(f"Lỗi ghi bản chụp {sheet_name}: {e}")
+        return False
+
+def has_snapshot(sheet_name):
+    """Đã có bản chụp của sheet trên đĩa chưa."""
+    return all(os.path.exists(path) for path in _paths(sheet_name))
+
+def load_snapshot(sheet_name):
+    """Đọc bản chụp 1 sheet. Trả về (DataFrame, fetched_at) hoặc None nếu chưa có / lỗi."""
+    data_path, meta_path = _paths(sheet_name)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        df = pd.read_parquet(data_path)
+        df.attrs["revision"] = meta.get("revision")
+        return df, float(meta.get("fetched_at", 0))
+    except Exception as e:
+        print(f"Lỗi đọc bản chụp {sheet_name}: {e}")
+        return None
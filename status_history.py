@@ -0,0 +1,130 @@
+import threading
+import time
+from datetime import date
+import streamlit as st
+import pandas as pd
+from config import DONE_STATUSES, HISTORY_SHEET, HISTORY_INTERVAL
+from gsheet import load_sheets, get_sheet_version, append_rows
+from report_stats import STATS_GROUPS, get_task_stats
+from utils import id_text, parse_date_series
+
+# =========================================================
+# 📉 LỊCH SỬ SỐ LIỆU CÔNG VIỆC (CHỤP THEO NGÀY, CHỈ GHI PHẦN THAY ĐỔI)
+# =========================================================
+# 7_CONG_VIEC chỉ giữ trạng thái hiện tại, nên số liệu tổng hợp (get_task_stats) được chụp lại
+# vào HISTORY_SHEET dạng dòng dài: NGAY_CHOT | NHOM | GIA_TRI | SO_VIEC.
+# - NHOM: cột được đếm (TRANG_THAI_TONG, NGUOI_NHAN, IDDA_CV) hoặc TOTAL_GROUP (tổng / còn lại / trễ hạn)
+# - Mỗi lần chụp chỉ ghi các (NHOM, GIA_TRI) có số việc khác lần ghi gần nhất; nhóm không còn việc -> ghi 0
+# Chuỗi theo ngày dựng lại bằng cách lấy số cuối mỗi ngày rồi điền tiếp (ffill) cho các ngày không đổi,
+# nên biểu đồ xu hướng / burndown chỉ đọc sheet lịch sử (nhỏ), không quét lại 7_CONG_VIEC cho từng ngày.
+HISTORY_COLS = ["NGAY_CHOT", "NHOM", "GIA_TRI", "SO_VIEC"]
+TOTAL_GROUP = "TONG"
+TOTAL_KEYS = {"TONG_SO": "Tổng số", "CON_LAI": "Còn lại (chưa xong)", "TRE_HAN": "Trễ hạn"}
+
+def snapshot_counts(stats):
+    """Số liệu 1 lần chụp dạng phẳng: (NHOM, GIA_TRI) -> số việc."""
+    done = int(stats["status"].reindex(DONE_STATUSES).fillna(0).sum())
+    counts = {
+        (TOTAL_GROUP, "TONG_SO"): int(stats["total"]),
+        (TOTAL_GROUP, "CON_LAI"): int(stats["total"]) - done,
+        (TOTAL_GROUP, "TRE_HAN"): int(stats["overdue"]),
+    }
+    for name, col in STATS_GROUPS.items():
+        for value, n in stats[name].items():
+            counts[(col, str(value))] = int(n)
+    return counts
+
+def clean_history(df):
+    """Bảng lịch sử đọc từ Sheet -> đủ HISTORY_COLS, bỏ dòng không có ngày, sắp theo ngày (giữ thứ tự ghi)."""
+    if df.empty or not set(HISTORY_COLS) <= set(df.columns):
+        return pd.DataFrame({
+            "NGAY_CHOT": pd.Series(dtype="datetime64[ns]"), "NHOM": pd.Series(dtype=object),
+            "GIA_TRI": pd.Series(dtype=object), "SO_VIEC": pd.Series(dtype="int64"),
+        })
+    out = pd.DataFrame({
+        "NGAY_CHOT": parse_date_series(df["NGAY_CHOT"], "date").dt.normalize(),
+        "NHOM": id_text(df["NHOM"]).values,
+        "GIA_TRI": id_text(df["GIA_TRI"]).values,
+        "SO_VIEC": pd.to_numeric(df["SO_VIEC"], errors="coerce").fillna(0).astype("int64").values,
+    }, index=df.index)
+    out = out[out["NGAY_CHOT"].notna() & (out["NHOM"] != "")]
+    return out.sort_values("NGAY_CHOT", kind="stable").reset_index(drop=True)
+
+def latest_counts(history):
+    """(NHOM, GIA_TRI) -> số việc của lần ghi gần nhất trong lịch sử (đã qua clean_history)."""
+    last = history.drop_duplicates(["NHOM", "GIA_TRI"], keep="last")
+    return dict(zip(zip(last["NHOM"], last["GIA_TRI"]), last["SO_VIEC"].astype(int)))
+
+def snapshot_delta(counts, previous):
+    """Phần cần ghi thêm: nhóm mới hoặc số việc thay đổi; nhóm đã có mà nay không còn việc -> 0."""
+    delta = {key: n for key, n in counts.items() if previous.get(key) != n}
+    delta.update({key: 0 for key, n in previous.items() if key not in counts and n != 0})
+    return delta
+
+def build_series(history, end=None):
+    """
+    Chuỗi số việc theo ngày: index là các ngày liên tục (đến end nếu có), cột MultiIndex (NHOM, GIA_TRI).
+    Ngày không có dòng ghi thì giữ số của ngày trước; trước lần ghi đầu tiên của 1 nhóm -> 0.
+    """
+    if history.empty:
+        return pd.DataFrame()
+    wide = history.pivot_table(index="NGAY_CHOT", columns=["NHOM", "GIA_TRI"], values="SO_VIEC", aggfunc="last")
+    last_day = wide.index.max() if end is None else max(wide.index.max(), pd.Timestamp(end).normalize())
+    days = pd.date_range(wide.index.min(), last_day, freq="D", name="NGAY_CHOT")
+    return wide.reindex(days).ffill().fillna(0).astype(int)
+
+def load_history():
+    """Bảng lịch sử hiện có (kể cả các dòng đang chờ ghi nền)."""
+    return clean_history(load_sheets([HISTORY_SHEET])[HISTORY_SHEET])
+
+@st.cache_resource
+def _get_history_cache():
+    """Lần chụp gần nhất của tiến trình (ngày, thời điểm) + chuỗi theo ngày đã dựng (version, ngày, chuỗi)."""
+    return {"lock": threading.Lock(), "checked": (None, 0.0), "series": None}
+
+def record_snapshot(today=None, force=False):
+    """
+    Chụp số liệu hiện tại vào HISTORY_SHEET, chỉ ghi phần thay đổi. Trả về số dòng đã ghi.
+    Mỗi tiến trình chụp tối đa 1 lần / HISTORY_INTERVAL giây trong cùng 1 ngày (sang ngày mới thì chụp ngay);
+    force=True bỏ qua giới hạn này. Số liệu lấy từ get_task_stats (đã cộng dồn sẵn), không đếm lại bảng.
+    Ghi lỗi thì chỉ bỏ qua lần chụp này, không làm hỏng tab Báo cáo.
+    """
+    today = pd.Timestamp(today or date.today()).normalize()
+    now = time.monotonic()
+    cache = _get_history_cache()
+    with cache["lock"]:
+        day, checked = cache["checked"]
+        if not force and day == today and now - checked < HISTORY_INTERVAL:
+            return 0
+        cache["checked"] = (today, now)
+
+    delta = snapshot_delta(snapshot_counts(get_task_stats(today)), latest_counts(load_history()))
+    if not delta:
+        return 0
+    rows = pd.DataFrame(
+        [(today, group, value, n) for (group, value), n in sorted(delta.items())],
+        columns=HISTORY_COLS,
+    )
+    try:
+        append_rows(HISTORY_SHEET, rows)
+    except Exception as e:
+        # Lịch sử chỉ để vẽ biểu đồ: ghi lỗi thì bỏ qua lần chụp này (thử lại sau HISTORY_INTERVAL)
+        print(f"Lỗi ghi lịch sử {HISTORY_SHEET}: {e}")
+        return 0
+    return len(rows)
+
+def get_history_series(today=None):
+    """Chuỗi số việc theo ngày (build_series) đến hôm nay, giữ lại theo version của HISTORY_SHEET. Không sửa kết quả trả về."""
+    today = pd.Timestamp(today or date.today()).normalize()
+    version = get_sheet_version(HISTORY_SHEET)
+    cache = _get_history_cache()
+    with cache["lock"]:
+        entry = cache["series"]
+    if entry is not None and entry[0] == version and entry[1] == today:
+        return entry[2]
+
+    series = build_series(load_history(), end=today)
+    if get_sheet_version(HISTORY_SHEET) == version: # Sheet không đổi trong lúc đọc
+        with cache["lock"]:
+            cache["series"] = (version, today, series)
+    return series
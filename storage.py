@@ -0,0 +1,365 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+import streamlit as st
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import rowcol_to_a1
+from pandas.io.parsers import TextParser
+from streamlit_gsheets import GSheetsConnection
+from config import LINK_CONFIG_RAW, STORAGE_BACKEND, SQLITE_PATH
+from utils import normalize_column_name
+
+# =========================================================
+# 🧩 GIAO DIỆN LƯU TRỮ CHUNG
+# =========================================================
+# Quy ước chung cho mọi backend:
+# - Tên cột truyền vào là tên đã chuẩn hóa (VD: TEN_VIEC), được so khớp với
+#   tiêu đề thật bằng normalize_column_name.
+# - Vị trí dòng là vị trí dòng dữ liệu 0-based (không tính dòng tiêu đề),
+#   đúng thứ tự read_sheet trả về.
+# - Dữ liệu ghi vào đã được gsheet._prepare_for_sheet chuyển ngày/NaN sang chuỗi.
+class SheetBackend:
+    """Giao diện đọc/ghi 1 'sheet' (bảng) cho gsheet.py."""
+
+    name = ""
+
+    def read_sheet(self, sheet_name):
+        """Đọc toàn bộ bảng (chưa làm sạch). Bảng không tồn tại -> raise."""
+        raise NotImplementedError
+
+    def read_columns(self, sheet_name, columns):
+        """
+        Chỉ đọc các cột được chỉ định (tên chuẩn hóa), giữ thứ tự cột của bảng.
+        Cột không có trong bảng thì bỏ qua. Mặc định: đọc cả bảng rồi cắt bớt.
+        """
+        df = self.read_sheet(sheet_name)
+        wanted = {normalize_column_name(c) for c in columns}
+        return df[[c for c in df.columns if normalize_column_name(c) in wanted]]
+
+    def overwrite_sheet(self, sheet_name, df):
+        """Ghi đè toàn bộ bảng."""
+        raise NotImplementedError
+
+    def append_rows(self, sheet_name, df_rows):
+        """Thêm dòng vào cuối bảng, cột thiếu được thêm vào cuối tiêu đề."""
+        raise NotImplementedError
+
+    def update_cells(self, sheet_name, updates):
+        """Ghi các ô: list (vị trí dòng, tên cột, giá trị)."""
+        raise NotImplementedError
+
+    def delete_rows(self, sheet_name, row_positions):
+        """Xóa các dòng theo vị trí."""
+        raise NotImplementedError
+
+    def read_header(self, sheet_name):
+        """Danh sách tên cột thật của bảng ([] nếu chưa có)."""
+        raise NotImplementedError
+
+    def read_column(self, sheet_name, col):
+        """Giá trị dạng chuỗi của 1 cột theo thứ tự dòng (dùng để định vị dòng)."""
+        raise NotImplementedError
+
+
+def header_positions(header):
+    """Ánh xạ tên cột chuẩn hóa -> vị trí cột (0-based) theo dòng tiêu đề."""
+    positions = {}
+    for i, col in enumerate(header):
+        positions.setdefault(normalize_column_name(col), i)
+    return positions
+
+def to_cell_value(value):
+    """Đổi 1 giá trị Python/numpy sang kiểu ghi được (Sheets API / SQLite)."""
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    if hasattr(value, "item"): # numpy scalar
+        return value.item()
+    return str(value)
+
+def _rows_by_header(df_rows, header, positions):
+    """Sắp giá trị từng dòng theo thứ tự cột của tiêu đề."""
+    values = []
+    for record in df_rows.to_dict("records"):
+        line = [""] * len(header)
+        for col, val in record.items():
+            line[positions[normalize_column_name(col)]] = to_cell_value(val)
+        values.append(line)
+    return values
+
+
+# =========================================================
+# ☁️ BACKEND GOOGLE SHEETS
+# =========================================================
+class GSheetsBackend(SheetBackend):
+    name = "gsheets"
+
+    def __init__(self):
+        self._worksheets = {}
+
+    @property
+    def conn(self):
+        """Kết nối st.connection (Streamlit tự cache)."""
+        return st.connection("gsheets", type=GSheetsConnection)
+
+    def _ws(self, sheet_name, create=False):
+        """gspread Worksheet, giữ lại để không phải tải metadata nhiều lần. create=True: chưa có thì tạo tab trống."""
+        ws = self._worksheets.get(sheet_name)
+        if ws is None:
+            try:
+                ws = self.conn.client._select_worksheet(worksheet=sheet_name)
+            except WorksheetNotFound:
+                if not create:
+                    raise
+                # Kích thước mặc định của tab mới trên Google Sheet; tiêu đề được ghi ở lần thêm dòng đầu
+                ws = self.conn.client._open_spreadsheet().add_worksheet(title=sheet_name, rows=1000, cols=26)
+            self._worksheets[sheet_name] = ws
+        return ws
+
+    def read_sheet(self, sheet_name):
+        df = self.conn.read(worksheet=sheet_name, ttl=0) # ttl=0: Cache do gsheet.py tự quản lý
+        return pd.DataFrame() if df is None else df
+
+    def read_columns(self, sheet_name, columns):
+        # Chỉ tải các dải cột cần (1 lần batch_get) thay vì cả bảng có các cột chữ dài
+        ws = self._ws(sheet_name)
+        header = ws.row_values(1)
+        if not header:
+            raise KeyError(f"Sheet {sheet_name} chưa có tiêu đề")
+        positions = header_positions(header)
+        indexes = sorted({positions[normalize_column_name(c)] for c in columns if normalize_column_name(c) in positions})
+        if not indexes:
+            return pd.DataFrame()
+
+        letters = [rowcol_to_a1(1, i + 1).rstrip("0123456789") for i in indexes]
+        ranges = ws.batch_get([f"{letter}1:{letter}" for letter in letters])
+        cols = [[r[0] if r else "" for r in value_range] for value_range in ranges]
+        n = max(len(c) for c in cols)
+        rows = [[c[i] if i < len(c) else "" for c in cols] for i in range(n)]
+        # Phân tích kiểu dữ liệu giống conn.read (gspread_dataframe dùng TextParser)
+        return TextParser(rows, header=0).read()
+
+    def overwrite_sheet(self, sheet_name, df):
+        # Hàm update của st-gsheets tự động clear và ghi đè
+        self.conn.update(worksheet=sheet_name, data=df)
+
+    def append_rows(self, sheet_name, df_rows):
+        ws = self._ws(sheet_name, create=True) # Giống SQLite: bảng chưa có thì tạo (VD: 12_LICH_SU)
+        header = ws.row_values(1)
+        positions = header_positions(header)
+
+        new_cols = [c for c in df_rows.columns if normalize_column_name(c) not in positions]
+        if new_cols:
+            ws.update(range_name=rowcol_to_a1(1, len(header) + 1), values=[new_cols])
+            for col in new_cols:
+                positions[normalize_column_name(col)] = len(header)
+                header.append(col)
+
+        values = _rows_by_header(df_rows, header, positions)
+        ws.append_rows(values, value_input_option="USER_ENTERED", table_range="A1")
+
+    def update_cells(self, sheet_name, updates):
+        ws = self._ws(sheet_name)
+        positions = header_positions(ws.row_values(1))
+        data = []
+        for row_pos, col, value in updates:
+            col_pos = positions[normalize_column_name(col)]
+            data.append({
+                "range": rowcol_to_a1(row_pos + 2, col_pos + 1), # +2: dòng tiêu đề + 1-based
+                "values": [[to_cell_value(value)]],
+            })
+        ws.batch_update(data, value_input_option="USER_ENTERED")
+
+    def delete_rows(self, sheet_name, row_positions):
+        # Xóa nhiều dòng trong 1 request, xóa từ dưới lên để không lệch vị trí
+        ws = self._ws(sheet_name)
+        requests = []
+        for pos in sorted(set(row_positions), reverse=True):
+            requests.append({"deleteDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS",
+                "startIndex": pos + 1, "endIndex": pos + 2, # +1: bỏ qua dòng tiêu đề
+            }}})
+        ws.spreadsheet.batch_update({"requests": requests})
+
+    def read_header(self, sheet_name):
+        return self._ws(sheet_name).row_values(1)
+
+    def read_column(self, sheet_name, col):
+        ws = self._ws(sheet_name)
+        positions = header_positions(ws.row_values(1))
+        if normalize_column_name(col) not in positions:
+            return []
+        return [str(v).strip() for v in ws.col_values(positions[normalize_column_name(col)] + 1)[1:]]
+
+
+# =========================================================
+# 🗄️ BACKEND SQLITE (CỤC BỘ, CÓ INDEX)
+# =========================================================
+def _q(name):
+    """Đặt tên bảng/cột trong dấu nháy kép cho SQLite."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+class SQLiteBackend(SheetBackend):
+    """
+    Mỗi sheet là 1 bảng, mọi cột kiểu TEXT, thứ tự dòng theo rowid.
+    Cột ID và cột liên kết khai báo trong LINK_CONFIG_RAW được đánh index.
+    """
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock() # SQLite chỉ cho 1 luồng ghi tại 1 thời điểm
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30))
+
+    def _columns(self, db, sheet_name):
+        return [r[1] for r in db.execute(f"PRAGMA table_info({_q(sheet_name)})")]
+
+    def _rowids(self, db, sheet_name):
+        return [r[0] for r in db.execute(f"SELECT rowid FROM {_q(sheet_name)} ORDER BY rowid")]
+
+    def _create_indexes(self, db, sheet_name, columns):
+        cfg = LINK_CONFIG_RAW.get(sheet_name, {})
+        wanted = [cfg.get("ID_COL")] + list(cfg.get("LINK_COLS", {}).keys())
+        positions = header_positions(columns)
+        for col in dict.fromkeys(c for c in wanted if c):
+            if col in positions:
+                real = columns[positions[col]]
+                db.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_q('idx_' + sheet_name + '_' + col)} "
+                    f"ON {_q(sheet_name)} ({_q(real)})"
+                )
+
+    def _insert(self, db, sheet_name, columns, values):
+        if not values:
+            return
+        cols_sql = ", ".join(_q(c) for c in columns)
+        marks = ", ".join("?" for _ in columns)
+        db.executemany(f"INSERT INTO {_q(sheet_name)} ({cols_sql}) VALUES ({marks})", values)
+
+    def read_sheet(self, sheet_name):
+        with self._connect() as db:
+            if not self._columns(db, sheet_name):
+                raise KeyError(f"Không có bảng {sheet_name}")
+            df = pd.read_sql_query(f"SELECT * FROM {_q(sheet_name)} ORDER BY rowid", db)
+        # Ô trống trả về NaN giống khi đọc từ Google Sheet
+        return df.replace("", float("nan"))
+
+    def read_columns(self, sheet_name, columns):
+        with self._connect() as db:
+            header = self._columns(db, sheet_name)
+            if not header:
+                raise KeyError(f"Không có bảng {sheet_name}")
+            wanted = {normalize_column_name(c) for c in columns}
+            real = [c for c in header if normalize_column_name(c) in wanted]
+            if not real:
+                return pd.DataFrame()
+            df = pd.read_sql_query(f"SELECT {', '.join(_q(c) for c in real)} FROM {_q(sheet_name)} ORDER BY rowid", db)
+        return df.replace("", float("nan"))
+
+    def overwrite_sheet(self, sheet_name, df):
+        columns = [str(c) for c in df.columns]
+        values = [[to_cell_value(v) for v in row] for row in df.itertuples(index=False, name=None)]
+        with self._lock, self._connect() as db, db:
+            db.execute(f"DROP TABLE IF EXISTS {_q(sheet_name)}")
+            db.execute(f"CREATE TABLE {_q(sheet_name)} ({', '.join(_q(c) + ' TEXT' for c in columns)})")
+            self._insert(db, sheet_name, columns, values)
+            self._create_indexes(db, sheet_name, columns)
+
+    def append_rows(self, sheet_name, df_rows):
+        with self._lock, self._connect() as db, db:
+            header = self._columns(db, sheet_name)
+            if not header:
+                db.execute(f"CREATE TABLE {_q(sheet_name)} ({', '.join(_q(c) + ' TEXT' for c in df_rows.columns)})")
+                header = [str(c) for c in df_rows.columns]
+            positions = header_positions(header)
+
+            for col in df_rows.columns:
+                if normalize_column_name(col) not in positions:
+                    db.execute(f"ALTER TABLE {_q(sheet_name)} ADD COLUMN {_q(col)} TEXT")
+                    positions[normalize_column_name(col)] = len(header)
+                    header.append(str(col))
+
+            self._insert(db, sheet_name, header, _rows_by_header(df_rows, header, positions))
+            self._create_indexes(db, sheet_name, header)
+
+    def update_cells(self, sheet_name, updates):
+        with self._lock, self._connect() as db, db:
+            header = self._columns(db, sheet_name)
+            positions = header_positions(header)
+            rowids = self._rowids(db, sheet_name)
+            for row_pos, col, value in updates:
+                real = header[positions[normalize_column_name(col)]]
+                db.execute(
+                    f"UPDATE {_q(sheet_name)} SET {_q(real)} = ? WHERE rowid = ?",
+                    (to_cell_value(value), rowids[row_pos]),
+                )
+
+    def delete_rows(self, sheet_name, row_positions):
+        with self._lock, self._connect() as db, db:
+            rowids = self._rowids(db, sheet_name)
+            db.executemany(
+                f"DELETE FROM {_q(sheet_name)} WHERE rowid = ?",
+                [(rowids[pos],) for pos in set(row_positions)],
+            )
+
+    def read_header(self, sheet_name):
+        with self._connect() as db:
+            return self._columns(db, sheet_name)
+
+    def read_column(self, sheet_name, col):
+        with self._connect() as db:
+            header = self._columns(db, sheet_name)
+            positions = header_positions(header)
+            if normalize_column_name(col) not in positions:
+                return []
+            real = header[positions[normalize_column_name(col)]]
+            rows = db.execute(f"SELECT {_q(real)} FROM {_q(sheet_name)} ORDER BY rowid").fetchall()
+        return ["" if r[0] is None else str(r[0]).strip() for r in rows]
+
+
+# =========================================================
+# 🔀 CHỌN BACKEND
+# =========================================================
+BACKENDS = {
+    "gsheets": GSheetsBackend,
+    "sqlite": SQLiteBackend,
+}
+
+def get_backend_name():
+    """Tên backend đang dùng: [general] STORAGE_BACKEND trong secrets, nếu không có thì lấy config."""
+    try:
+        name = st.secrets.get("general", {}).get("STORAGE_BACKEND", STORAGE_BACKEND)
+    except Exception:
+        name = STORAGE_BACKEND
+    return str(name).strip().lower()
+
+@st.cache_resource
+def _create_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND không hợp lệ: {name} (chọn: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+def get_backend(name=None):
+    """Backend lưu trữ dùng chung cho cả tiến trình."""
+    return _create_backend(name or get_backend_name())
+
+def copy_sheets(source, target, sheet_names):
+    """
+    Chép nguyên trạng các sheet từ backend này sang backend khác
+    (VD: đồng bộ dữ liệu SQLite cục bộ lên Google Sheet). Trả về danh sách sheet đã chép.
+    """
+    copied = []
+    for sheet_name in sheet_names:
+        try:
+            df = source.read_sheet(sheet_name)
+        except Exception:
+            continue
+        target.overwrite_sheet(sheet_name, df.astype(object).where(df.notna(), ""))
+        copied.append(sheet_name)
+    return copied
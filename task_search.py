@@ -0,0 +1,168 @@
+import re
+import threading
+import unicodedata
+import numpy as np
+import pandas as pd
+import streamlit as st
+from gsheet import load_sheets, get_sheet_version, get_appended_since
+from utils import fold_vietnamese, id_text
+
+# =========================================================
+# 🔎 TÌM KIẾM CÔNG VIỆC (CHỈ MỤC TỪ KHÓA KHÔNG DẤU)
+# =========================================================
+# Chỉ mục ngược: từ (đã bỏ dấu, chữ thường) -> các dòng chứa từ đó + điểm theo cột.
+# Lưu dạng mảng: từ điển sắp xếp + vị trí bắt đầu của từng từ trong mảng dòng/điểm,
+# nên mọi từ có cùng tiền tố nằm liền nhau (tra 1 lần searchsorted).
+# Dựng theo version của 7_CONG_VIEC; sheet chỉ được thêm dòng thì chỉ tách từ các dòng mới.
+SEARCH_SHEET = "7_CONG_VIEC"
+SEARCH_FIELDS = {"TEN_VIEC": 3.0, "NOI_DUNG": 1.0, "GHI_CHU_CV": 1.0, "VUONG_MAC": 1.0} # Cột -> trọng số
+EXACT_BONUS = 2.0 # Khớp nguyên từ được nhân điểm so với chỉ khớp tiền tố
+_TOKEN = re.compile(r"[^\W_]+") # Chữ/số liền nhau
+_ROW_SEP = "\x01" # Không phải khoảng trắng với str.split()
+
+def tokenize(text):
+    """Tách từ khóa tìm kiếm (bỏ dấu, chữ thường): 'Hợp đồng' -> ['hop', 'dong']."""
+    text = unicodedata.normalize("NFC", str(text).lower())
+    return [fold_vietnamese(token) for token in _TOKEN.findall(text)]
+
+def _column_tokens(series):
+    """
+    (vị trí dòng, cụm chữ thường còn dấu/dấu câu) của cả cột. Ghép cả cột thành 1 chuỗi (ngăn bằng
+    \\x01) rồi tách theo khoảng trắng 1 lần thay vì xử lý từng ô; dấu ngăn cho biết cụm thuộc dòng nào.
+    """
+    values = series.astype("string").fillna("").tolist()
+    text = _ROW_SEP.join(values)
+    if text.count(_ROW_SEP) > max(len(values) - 1, 0): # Ô có sẵn ký tự ngăn cách -> bỏ đi
+        text = _ROW_SEP.join(v.replace(_ROW_SEP, " ") for v in values)
+    text = unicodedata.normalize("NFC", text.lower()).replace(_ROW_SEP, f" {_ROW_SEP} ")
+    parts = np.array(text.split(), dtype=object)
+    is_sep = parts == _ROW_SEP
+    return np.cumsum(is_sep)[~is_sep], parts[~is_sep]
+
+def _postings(df, start=0):
+    """Mảng (cụm, dòng, điểm) của các dòng df (dòng tính từ vị trí start)."""
+    rows, chunks, scores = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=object)], [np.empty(0, dtype=np.float32)]
+    for col, weight in SEARCH_FIELDS.items():
+        if col in df.columns:
+            col_rows, col_chunks = _column_tokens(df[col])
+            rows.append(col_rows + start)
+            chunks.append(col_chunks)
+            scores.append(np.full(len(col_rows), weight, dtype=np.float32))
+    return np.concatenate(chunks), np.concatenate(rows), np.concatenate(scores)
+
+def _build(chunks, rows, scores, ids):
+    """
+    Đóng gói (cụm, dòng, điểm) thành chỉ mục. Chỉ tách từ + bỏ dấu mỗi cụm khác nhau 1 lần
+    ('đồng,' / 'hợp-đồng' -> các từ không dấu), rồi mã hóa từ theo thứ tự từ điển, gộp cặp (từ, dòng)
+    trùng (cộng điểm) và sắp theo (từ, dòng) -> các dòng của 1 từ nằm liền nhau.
+    """
+    chunk_codes, chunk_vocab = pd.factorize(chunks)
+    words = [tokenize(chunk) for chunk in chunk_vocab]
+    counts = np.array([len(w) for w in words], dtype=np.int64)
+    word_codes, vocab = pd.factorize(np.array([w for ws in words for w in ws], dtype=object), sort=True)
+
+    # Mỗi cụm -> counts[cụm] từ: nhân bản (dòng, điểm) tương ứng
+    per_posting = counts[chunk_codes]
+    src = np.repeat(np.arange(len(chunk_codes)), per_posting)
+    first_word = (np.cumsum(counts) - counts)[chunk_codes]
+    offset = np.arange(len(src)) - np.repeat(np.cumsum(per_posting) - per_posting, per_posting)
+    codes = word_codes[first_word[src] + offset].astype(np.int64)
+
+    n = max(len(ids), 1)
+    keys, inverse = np.unique(codes * n + rows[src], return_inverse=True)
+    scores = np.bincount(inverse, weights=scores[src], minlength=len(keys))
+    return _pack(np.asarray(vocab, dtype=str), keys // n, keys % n, scores, ids)
+
+def _pack(vocab, codes, rows, scores, ids):
+    """Chỉ mục từ các cặp (mã từ, dòng) đã sắp xếp: dòng của từ thứ i nằm trong rows[starts[i]:starts[i+1]]."""
+    return {
+        "vocab": vocab,
+        "starts": np.searchsorted(codes, np.arange(len(vocab) + 1)),
+        "rows": np.asarray(rows, dtype=np.int64),
+        "scores": np.asarray(scores, dtype=np.float32),
+        "ids": np.asarray(ids, dtype=object),
+    }
+
+def build_search_index(df):
+    """Dựng chỉ mục cho bảng công việc (cần ID_CONG_VIEC + các cột trong SEARCH_FIELDS)."""
+    return _build(*_postings(df), id_text(df["ID_CONG_VIEC"]).to_numpy())
+
+def extend_search_index(index, df_new):
+    """Thêm các dòng mới (nối cuối bảng) vào chỉ mục mà không tách từ lại các dòng cũ."""
+    ids = np.concatenate([index["ids"], id_text(df_new["ID_CONG_VIEC"]).to_numpy()])
+    new = _build(*_postings(df_new, start=len(index["ids"])), ids)
+
+    # Gộp 2 từ điển rồi đổi mã từ của cả 2 phần sang từ điển chung
+    vocab = np.union1d(index["vocab"], new["vocab"])
+    codes = np.concatenate([
+        np.repeat(np.searchsorted(vocab, part["vocab"]), np.diff(part["starts"])) for part in (index, new)
+    ])
+    rows = np.concatenate([index["rows"], new["rows"]])
+    order = np.argsort(codes * len(ids) + rows, kind="stable")
+    return _pack(vocab, codes[order], rows[order], np.concatenate([index["scores"], new["scores"]])[order], ids)
+
+def search_index(index, query, limit=None):
+    """
+    Tìm trong chỉ mục: mọi từ trong query phải khớp (nguyên từ hoặc tiền tố, không dấu).
+    Trả về danh sách ID công việc xếp theo điểm giảm dần (cùng điểm: theo thứ tự trong sheet).
+    """
+    terms = tokenize(query)
+    n = len(index["ids"])
+    if not terms or n == 0:
+        return []
+    vocab, starts = index["vocab"], index["starts"]
+    total = np.zeros(n)
+    hit = np.ones(n, dtype=bool)
+    for term in dict.fromkeys(terms):
+        lo = np.searchsorted(vocab, term, side="left")
+        hi = np.searchsorted(vocab, term + "\uffff", side="left")
+        if lo == hi:
+            return []
+        rows = index["rows"][starts[lo]:starts[hi]]
+        scores = index["scores"][starts[lo]:starts[hi]].copy()
+        if vocab[lo] == term:
+            scores[:starts[lo + 1] - starts[lo]] *= EXACT_BONUS
+        term_score = np.bincount(rows, weights=scores, minlength=n) # Nhiều từ cùng tiền tố -> cộng điểm
+        hit &= term_score > 0
+        total += term_score
+    found = np.flatnonzero(hit)
+    if limit is not None and len(found) > limit:
+        # Chỉ cần limit kết quả tốt nhất: chọn trước rồi mới sắp xếp phần được chọn
+        found = np.sort(found[np.argpartition(-total[found], limit - 1)[:limit]])
+    order = found[np.argsort(-total[found], kind="stable")]
+    return list(dict.fromkeys(index["ids"][order].tolist()))
+
+@st.cache_resource
+def _get_search_cache():
+    """Chỉ mục gần nhất: (version 7_CONG_VIEC, số dòng, chỉ mục)."""
+    return {"lock": threading.Lock(), "entry": None}
+
+def get_search_index():
+    """Chỉ mục tìm kiếm của 7_CONG_VIEC theo version hiện tại (dựng / bổ sung khi cần)."""
+    version = get_sheet_version(SEARCH_SHEET)
+    columns = ["ID_CONG_VIEC", *SEARCH_FIELDS]
+    df = load_sheets([SEARCH_SHEET], columns={SEARCH_SHEET: columns})[SEARCH_SHEET]
+    loaded_version = get_sheet_version(SEARCH_SHEET)
+
+    cache = _get_search_cache()
+    with cache["lock"]:
+        entry = cache["entry"]
+    if entry is not None and entry[0] == loaded_version:
+        return entry[2]
+    if "ID_CONG_VIEC" not in df.columns:
+        return _build(*_postings(df.iloc[:0]), [])
+
+    start = get_appended_since(SEARCH_SHEET, entry[0]) if entry is not None else None
+    if start is not None and start == entry[1] and start <= len(df):
+        index = extend_search_index(entry[2], df.iloc[start:])
+    else:
+        index = build_search_index(df)
+
+    if version == loaded_version: # Sheet không đổi trong lúc đọc -> chỉ mục khớp version
+        with cache["lock"]:
+            cache["entry"] = (loaded_version, len(df), index)
+    return index
+
+def search_tasks(query, limit=None):
+    """ID công việc khớp query (không dấu, khớp tiền tố), xếp theo mức độ phù hợp."""
+    return search_index(get_search_index(), query, limit)
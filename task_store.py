@@ -0,0 +1,77 @@
+from config import TASK_COLUMNS, TASK_COLUMN_ALIASES, TASK_DEFAULTS, LINK_CONFIG_RAW
+from gsheet import append_rows, get_display_index
+from id_allocator import reserve
+from utils import normalize_columns, date_kind, parse_date_series, id_text
+
+# =========================================================
+# 📥 THÊM CÔNG VIỆC THEO LÔ
+# =========================================================
+TASK_SHEET = "7_CONG_VIEC"
+
+def _blank(series):
+    """Ô trống / chỉ có khoảng trắng / NaN -> True (cả cột 1 lần)."""
+    return series.astype("string").str.strip().fillna("").eq("")
+
+def conform_tasks(df):
+    """
+    Đưa 1 lô dòng công việc về đúng 22 cột chuẩn (TASK_COLUMNS), xử lý cả cột 1 lần:
+    - chuẩn hóa tên cột, đổi tên cũ (TRANG_THAI -> TRANG_THAI_TONG...), bỏ cột lạ
+    - bỏ dòng không có TEN_VIEC, điền mặc định (TASK_DEFAULTS)
+    - đọc cột ngày theo DATE_SCHEMA (ô sai định dạng -> trống)
+    - cảnh báo ID liên kết không có trong danh mục (giữ nguyên giá trị)
+    Trả về (DataFrame, list cảnh báo).
+    """
+    issues = []
+    df = normalize_columns(df.copy()).rename(columns=TASK_COLUMN_ALIASES)
+    df = df.loc[:, ~df.columns.duplicated()]
+    unknown = [c for c in df.columns if c not in TASK_COLUMNS]
+    if unknown:
+        issues.append(f"Bỏ qua cột không có trong sheet: {', '.join(unknown)}")
+    df = df.reindex(columns=TASK_COLUMNS).reset_index(drop=True)
+
+    no_name = _blank(df["TEN_VIEC"])
+    if no_name.any():
+        issues.append(f"Bỏ {int(no_name.sum())} dòng không có tên công việc")
+        df = df[~no_name].reset_index(drop=True)
+
+    for col, value in TASK_DEFAULTS.items():
+        df[col] = df[col].mask(_blank(df[col]), value)
+
+    for col in TASK_COLUMNS:
+        kind = date_kind(col)
+        if kind is None:
+            continue
+        parsed = parse_date_series(df[col], kind)
+        bad = parsed.isna() & ~_blank(df[col])
+        if bad.any():
+            issues.append(f"{col}: {int(bad.sum())} ô sai định dạng ngày, để trống")
+        df[col] = parsed.astype(object).where(parsed.notna(), "")
+
+    for col, (target, _) in LINK_CONFIG_RAW[TASK_SHEET]["LINK_COLS"].items():
+        if col not in df.columns:
+            continue
+        ids = id_text(df[col]).str.split(",").explode().str.strip()
+        ids = ids[ids.ne("")]
+        if ids.empty: # Không có mã nào cần kiểm -> khỏi tải bảng đích
+            continue
+        missing = ids[~ids.isin(list(get_display_index(target)))].unique()
+        if len(missing):
+            issues.append(f"{col}: không tìm thấy {', '.join(missing)} trong {target}")
+
+    text_cols = [c for c in TASK_COLUMNS if date_kind(c) is None]
+    df[text_cols] = df[text_cols].astype(object).where(df[text_cols].notna(), "")
+    return df, issues
+
+def insert_tasks(df):
+    """
+    Thêm 1 lô công việc: chuẩn hóa (conform_tasks), cấp ID 1 lần cho các dòng chưa có ID,
+    rồi ghi tất cả bằng 1 lần append. Trả về (DataFrame đã ghi, list cảnh báo).
+    """
+    df, issues = conform_tasks(df)
+    if df.empty:
+        return df, issues
+    no_id = _blank(df["ID_CONG_VIEC"])
+    if no_id.any():
+        df.loc[no_id, "ID_CONG_VIEC"] = reserve("CV", int(no_id.sum()))
+    append_rows(TASK_SHEET, df)
+    return df, issues
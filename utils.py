@@ -1,35 +1,48 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
-from datetime import datetime
+from functools import lru_cache
 import re
+import weakref
+from config import DATE_SCHEMA, DATE_READ_FORMATS, DATE_WRITE_FORMATS
 
 # =========================================================
 # 🧹 PHẦN 1: CÁC HÀM XỬ LÝ DỮ LIỆU (CHO GSHEET.PY)
 # =========================================================
 
+# Bảng bỏ dấu tiếng Việt dựng sẵn 1 lần (dùng chung cho chuẩn hóa cột, tìm kiếm, so khớp)
+_VN_BASE = {
+    "A": "ÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴ", "E": "ÈÉẸẺẼÊỀẾỆỂỄ", "O": "ÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠ",
+    "I": "ÌÍỊỈĨ", "U": "ÙÚỤỦŨƯỪỨỰỬỮ", "Y": "ỲÝỴỶỸ", "D": "Đ",
+}
+_VN_FOLD = {}
+for _base, _chars in _VN_BASE.items():
+    _VN_FOLD.update({ord(c): _base for c in _chars})
+    _VN_FOLD.update({ord(c.lower()): _base.lower() for c in _chars})
+_VN_FOLD.update({c: None for c in range(0x0300, 0x0370)}) # Dấu rời (chuỗi dạng NFD)
+_NON_WORD = re.compile(r'[^A-Z0-9]+')
+
+def fold_vietnamese(text):
+    """Bỏ dấu tiếng Việt, giữ nguyên hoa/thường: 'Đường Hầm' -> 'Duong Ham'."""
+    return str(text).translate(_VN_FOLD)
+
+@lru_cache(maxsize=4096)
+def normalize_column_name(col):
+    """Chuẩn hóa 1 tên cột: Viết hoa, bỏ dấu, thay khoảng trắng bằng _"""
+    s = fold_vietnamese(str(col).strip().upper())
+    # Ký tự đặc biệt (liền nhau) -> 1 dấu _
+    return _NON_WORD.sub('_', s).strip('_')
+
+@lru_cache(maxsize=256)
+def _normalized_header(header):
+    return tuple(normalize_column_name(col) for col in header)
+
 def normalize_columns(df):
     """Chuẩn hóa tên cột: Viết hoa, bỏ dấu, thay khoảng trắng bằng _"""
     if df.empty: return df
     
-    new_cols = []
-    for col in df.columns:
-        s = str(col).strip().upper()
-        # Bỏ dấu tiếng Việt
-        s = re.sub(r'[ÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴ]', 'A', s)
-        s = re.sub(r'[ÈÉẸẺẼÊỀẾỆỂỄ]', 'E', s)
-        s = re.sub(r'[ÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠ]', 'O', s)
-        s = re.sub(r'[ÌÍỊỈĨ]', 'I', s)
-        s = re.sub(r'[ÙÚỤỦŨƯỪỨỰỬỮ]', 'U', s)
-        s = re.sub(r'[ỲÝỴỶỸ]', 'Y', s)
-        s = re.sub(r'[Đ]', 'D', s)
-        # Thay ký tự đặc biệt bằng _
-        s = re.sub(r'[^A-Z0-9_]', '_', s)
-        # Xóa _ thừa
-        s = re.sub(r'_+', '_', s)
-        s = s.strip('_')
-        new_cols.append(s)
-    
-    df.columns = new_cols
+    # Tiêu đề không đổi giữa các lần tải -> chỉ tốn 1 lần tra dict
+    df.columns = list(_normalized_header(tuple(df.columns)))
     return df
 
 def remove_duplicate_and_empty_cols(df):
@@ -40,18 +53,172 @@ def remove_duplicate_and_empty_cols(df):
     cols_to_keep = [c for c in df.columns if "UNNAMED" not in str(c).upper() and str(c).strip() != ""]
     return df[cols_to_keep]
 
+def date_kind(col):
+    """Kiểu ngày của 1 cột theo DATE_SCHEMA ("date" / "datetime"), None nếu không phải cột ngày."""
+    return DATE_SCHEMA.get(col)
+
+def parse_date_series(series, kind="date"):
+    """
+    Đọc 1 cột chuỗi thành datetime: thử lần lượt các định dạng trong DATE_READ_FORMATS
+    (mỗi định dạng parse cả cột 1 lần, chỉ các ô chưa đọc được mới thử định dạng sau).
+    Ô trống / sai định dạng -> NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    text = series.astype("string").str.strip().replace("", pd.NA)
+    formats = DATE_READ_FORMATS.get(kind, DATE_READ_FORMATS["date"])
+    # Đa số ô đúng định dạng chuẩn -> parse cả cột 1 lần, phần còn lại thử các định dạng sau
+    result = pd.to_datetime(text, format=formats[0], errors="coerce").astype("datetime64[ns]")
+    todo = result.isna() & text.notna()
+    for fmt in formats[1:]:
+        if not todo.any():
+            break
+        parsed = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+        ok = parsed[parsed.notna()]
+        result[ok.index] = ok
+        todo[ok.index] = False
+    return result
+
 def parse_dates(df, date_cols=None):
-    """Chuyển đổi các cột ngày tháng sang datetime object"""
+    """Chuyển đổi các cột ngày tháng (khai báo trong DATE_SCHEMA) sang datetime object"""
     if df.empty: return df
     
     if not date_cols:
-        date_cols = [c for c in df.columns if any(x in c for x in ['NGAY', 'HAN', 'THOI_GIAN'])]
+        date_cols = [c for c in df.columns if c in DATE_SCHEMA]
     
     for col in date_cols:
         if col in df.columns:
-            df[col] = pd.to_datetime(df[col], dayfirst=True, errors='coerce')
+            df[col] = parse_date_series(df[col], date_kind(col) or "date")
     return df
 
+def format_date_value(value, col=None):
+    """1 giá trị ngày (datetime/date) -> chuỗi theo định dạng ghi chuẩn của cột. Ô trống -> ""."""
+    if value is None or pd.isnull(value):
+        return ""
+    if isinstance(value, str):
+        return value
+    return value.strftime(DATE_WRITE_FORMATS[date_kind(col) or "date"])
+
+def format_dates(df):
+    """Bản sao DataFrame với các cột datetime đổi sang chuỗi theo định dạng ghi chuẩn (NaT -> "")."""
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime(DATE_WRITE_FORMATS[date_kind(col) or "date"]).fillna("")
+    return df
+
+# ---------------------------------------------------------
+# 🧱 KIỂU DỮ LIỆU THEO SCHEMA (SHEET_DTYPES)
+# ---------------------------------------------------------
+_NUMBER_NOISE = re.compile(r'[\s₫đĐ]|VND|VNĐ', re.IGNORECASE)
+_THOUSANDS = re.compile(r'^-?\d{1,3}([.,]\d{3})+$')
+
+def text_dtype():
+    """
+    Kiểu chữ lưu bằng Arrow, ô trống là NaN (so sánh/lọc như cột object).
+    Pandas cũ hoặc thiếu pyarrow -> None (giữ object).
+    """
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except Exception:
+        return None
+
+def _to_number(series):
+    """Đọc cột số kiểu Việt Nam ('1.500.000 đ', '2,5'). Trả về (Series số, số ô không đọc được)."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series, 0
+    text = series.astype("string").str.replace(_NUMBER_NOISE, "", regex=True)
+    thousands = text.str.match(_THOUSANDS).fillna(False)
+    text = text.where(~thousands, text.str.replace(r'[.,]', '', regex=True)).str.replace(",", ".", regex=False)
+    numbers = pd.to_numeric(text.replace("", pd.NA), errors="coerce")
+    bad = int((numbers.isna() & text.notna() & (text != "")).sum())
+    return numbers, bad
+
+def apply_dtypes(df, schema, text_as_arrow=True):
+    """
+    Ép kiểu các cột theo schema {cột: dtype}; cột chữ còn lại -> text_dtype() nếu text_as_arrow.
+    Không làm mất dữ liệu: cột không đổi được thì giữ nguyên và ghi vào danh sách cảnh báo.
+    Trả về (DataFrame, list cảnh báo).
+    """
+    if df.empty: return df, []
+
+    issues = []
+    text = text_dtype() if text_as_arrow else None
+    for col in df.columns:
+        dtype = schema.get(col)
+        series = df[col]
+        try:
+            if dtype in ("Float64", "Int64"):
+                numbers, bad = _to_number(series)
+                if bad:
+                    issues.append(f"{col}: {bad} ô không phải số, giữ nguyên kiểu chữ")
+                    continue
+                if dtype == "Int64" and (numbers.dropna() % 1 != 0).any():
+                    issues.append(f"{col}: có số lẻ, dùng Float64 thay cho Int64")
+                    dtype = "Float64"
+                df[col] = numbers.astype(dtype)
+            elif dtype == "category":
+                df[col] = series.astype("category")
+            elif dtype is not None:
+                df[col] = series.astype(text if dtype == "string" and text is not None else dtype)
+            elif text is not None and (series.dtype == object or pd.api.types.is_string_dtype(series)):
+                # Cột object lẫn số/chữ: đổi số sang chữ, giữ ô trống
+                df[col] = series.where(series.isna(), series.astype(str)).astype(text)
+        except Exception as e:
+            issues.append(f"{col}: không đổi được sang {dtype or text} ({e})")
+    return df, issues
+
+def to_text_frame(df):
+    """
+    Bản sao toàn chữ để hiển thị/sửa trên st.data_editor: ngày theo định dạng ghi chuẩn,
+    ô trống vẫn là ô trống (không thành chữ "nan"), chữ lưu bằng Arrow nếu có.
+    """
+    df = format_dates(df)
+    text = text_dtype() or object
+    for col in df.columns:
+        values = df[col].astype(object)
+        df[col] = values.where(values.isna(), values.astype(str)).astype(text)
+    return df
+
+def memory_bytes(df):
+    """Dung lượng thực của DataFrame (tính cả nội dung chuỗi)."""
+    return int(df.memory_usage(deep=True).sum())
+
+_MISSING_TEXT = {"nan", "NaN", "None", "NaT", "<NA>"}
+
+def _as_cell_text(df):
+    """Đưa DataFrame về dạng chuỗi để so sánh (giá trị rỗng/NaN -> "")."""
+    out = df.astype(object).where(df.notna(), "").astype(str)
+    return out.mask(out.isin(_MISSING_TEXT), "")
+
+def diff_frames(df_old, df_new):
+    """
+    So sánh bảng gốc và bảng đã sửa (cùng index gốc, VD: từ st.data_editor).
+    Trả về None nếu tiêu đề cột thay đổi, ngược lại dict:
+    - changed: list (index, cột, giá trị mới) của các ô bị sửa
+    - added: DataFrame các dòng mới thêm
+    - deleted: list index các dòng bị xóa
+    """
+    if list(df_old.columns) != list(df_new.columns):
+        return None
+
+    old_idx = set(df_old.index)
+    new_idx = set(df_new.index)
+    common = [i for i in df_old.index if i in new_idx]
+
+    changed = []
+    if common and len(df_old.columns):
+        old_txt = _as_cell_text(df_old.loc[common])
+        new_txt = _as_cell_text(df_new.loc[common])
+        mask = old_txt.ne(new_txt).stack()
+        for idx, col in mask[mask].index:
+            changed.append((idx, col, new_txt.at[idx, col]))
+
+    added = df_new.loc[[i for i in df_new.index if i not in old_idx]]
+    deleted = [i for i in df_old.index if i not in new_idx]
+
+    return {"changed": changed, "added": _as_cell_text(added), "deleted": deleted}
+
 # =========================================================
 # 🎨 PHẦN 2: CÁC HÀM HIỂN THỊ & FORMAT (CHO GIAO DIỆN)
 # =========================================================
@@ -75,6 +242,112 @@ def format_date_vn(date_obj):
     except:
         return ""
 
+def format_date_column(series, fmt="%d/%m/%Y", na="-"):
+    """
+    Định dạng cả 1 cột ngày để hiển thị (thay cho .apply(format_date_vn)).
+    - Cột datetime: strftime 1 lần trên các giá trị khác nhau rồi trải lại cho cả cột.
+    - Cột chữ/hỗn hợp: đọc ngày 1 lượt theo DATE_READ_FORMATS; ô không đọc được giữ nguyên chữ.
+    Ô trống / NaT -> na.
+    """
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        text = series.astype("string").str.strip().fillna("")
+        parsed = parse_date_series(series, "datetime" if "%H" in fmt else "date")
+        out = format_date_column(parsed, fmt, na)
+        keep = parsed.isna() & (text != "")
+        return out.where(~keep, text).astype(object)
+
+    # Bỏ phần giờ/giây không hiển thị để số giá trị khác nhau (số lần strftime) ít đi
+    if not any(x in fmt for x in ("%H", "%I", "%M", "%S", "%p")):
+        series = series.dt.normalize()
+    elif "%S" not in fmt:
+        series = series.dt.floor("min")
+    codes, uniques = pd.factorize(series)
+    texts = np.array(pd.Index(uniques).strftime(fmt).tolist() + [na], dtype=object) # code -1 (NaT) -> phần tử cuối
+    return pd.Series(texts[codes], index=series.index, dtype=object)
+
+# ---------------------------------------------------------
+# 🔎 CHỈ MỤC ID -> TÊN HIỂN THỊ (dựng 1 lần, tra O(1))
+# ---------------------------------------------------------
+_INT_TEXT = re.compile(r'^-?\d+\.0+$')
+
+def id_text(values):
+    """Đưa cột ID về chuỗi so khớp được: bỏ khoảng trắng, 1.0 -> "1", ô trống -> ""."""
+    text = pd.Series(values).astype("string").str.strip().fillna("")
+    dotted = text.str.contains(".", regex=False)
+    if dotted.any():
+        is_int = text[dotted].str.match(_INT_TEXT)
+        is_int = is_int[is_int].index
+        text[is_int] = text[is_int].str.split(".").str[0]
+    return text.astype(object)
+
+def _display_text(ref_df, display_cols):
+    """Ghép các cột hiển thị của từng dòng: 'Tên - Chức vụ' (bỏ ô trống, ngày -> dd/mm/yyyy)."""
+    parts = []
+    for col in display_cols:
+        if col not in ref_df.columns:
+            continue
+        values = ref_df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = format_date_column(values, na="")
+        parts.append(values.astype("string").str.strip().fillna(""))
+    if not parts:
+        return pd.Series("", index=ref_df.index, dtype=object)
+    joined = parts[0]
+    for part in parts[1:]:
+        sep = ((joined != "") & (part != "")).map({True: " - ", False: ""})
+        joined = joined + sep + part
+    return joined.astype(object)
+
+def build_display_index(ref_df, id_col, display_cols):
+    """
+    Dựng dict ID -> chuỗi hiển thị cho 1 bảng danh mục.
+    ID trùng: lấy dòng đầu tiên (giống lookup_display trước đây). Không có tên -> hiển thị ID.
+    """
+    if ref_df.empty or id_col not in ref_df.columns:
+        return {}
+    keys = id_text(ref_df[id_col])
+    texts = _display_text(ref_df, display_cols)
+    texts = texts.where(texts != "", keys.values)
+    index = {}
+    for key, text in zip(keys.tolist(), texts.tolist()):
+        if key and key not in index:
+            index[key] = text
+    return index
+
+def map_display(values, index):
+    """Tra cả cột ID cùng lúc (Series.map). ID không có trong chỉ mục -> giữ ID; ô trống -> ""."""
+    keys = id_text(values)
+    return keys.map(index).fillna(keys).astype(object)
+
+def map_display_multi(values, index, sep=","):
+    """
+    Như map_display nhưng ô có nhiều ID cách nhau bởi sep ('NS01, NS02') được tra từng ID
+    rồi ghép lại 'Tên 1, Tên 2'. Chỉ tách các ô thực sự có sep.
+    """
+    values = pd.Series(values)
+    out = map_display(values, index)
+    multi = values.astype("string").str.contains(sep, regex=False).fillna(False).values
+    if multi.any():
+        parts = values[multi].astype(str).str.split(sep).explode()
+        names = map_display(parts, index)
+        joined = names[names != ""].groupby(level=0).agg(", ".join)
+        out[multi] = joined.reindex(values.index[multi]).fillna("").values
+    return out
+
+# Chỉ mục dựng từ 1 DataFrame cụ thể (theo id()), tự xóa khi DataFrame đó bị giải phóng
+_DISPLAY_INDEX_MEMO = {}
+
+def _memo_display_index(ref_df, id_col, display_cols):
+    entry = _DISPLAY_INDEX_MEMO.get(id(ref_df))
+    if entry is None or entry[0]() is not ref_df:
+        ref = weakref.ref(ref_df, lambda _, k=id(ref_df): _DISPLAY_INDEX_MEMO.pop(k, None))
+        entry = _DISPLAY_INDEX_MEMO[id(ref_df)] = (ref, {})
+    memo = entry[1]
+    key = (id_col, tuple(display_cols), len(ref_df))
+    if key not in memo:
+        memo[key] = build_display_index(ref_df, id_col, display_cols)
+    return memo[key]
+
 def lookup_display(id_val, ref_df, id_col, display_cols):
     """Tìm ID và trả về Tên hiển thị."""
     if pd.isnull(id_val) or str(id_val).strip() == "":
@@ -82,20 +355,9 @@ def lookup_display(id_val, ref_df, id_col, display_cols):
         
     if ref_df.empty or id_col not in ref_df.columns:
         return str(id_val)
-        
-    row = ref_df[ref_df[id_col].astype(str) == str(id_val)]
-    
-    if row.empty:
-        return str(id_val)
     
-    displays = []
-    for col in display_cols:
-        if col in row.columns:
-            val = row.iloc[0][col]
-            if pd.notnull(val) and str(val).strip():
-                 displays.append(str(val))
-    
-    return " - ".join(displays) if displays else str(id_val)
+    key = id_text([id_val])[0]
+    return _memo_display_index(ref_df, id_col, display_cols).get(key, str(id_val))
 
 def get_display_list_multi(df, id_col, cols, prefix="Chọn..."):
     """
@@ -104,29 +366,35 @@ def get_display_list_multi(df, id_col, cols, prefix="Chọn..."):
     if df.empty or id_col not in df.columns:
         return [prefix], {prefix: ""}
 
-    display_list = [prefix]
-    mapping = {prefix: ""}
+    # Ghép chuỗi theo cả cột (không lặp từng dòng)
+    keys = id_text(df[id_col])
+    valid = (keys != "").values
+    ids = df[id_col][valid]
+    texts = _display_text(df[valid], [c for c in cols if c in df.columns])
+    labels = ids.astype(str).str.strip()
+    labels = labels.where(texts == "", labels + " | " + texts)
 
-    valid_cols = [c for c in cols if c in df.columns]
+    display_list = [prefix] + labels.tolist()
+    mapping = {prefix: ""}
+    mapping.update(zip(labels.tolist(), ids.tolist()))
+    return display_list, mapping
 
-    for _, row in df.iterrows():
-        id_val = row.get(id_col, "")
-        if pd.isnull(id_val) or str(id_val).strip() == "":
-            continue
-            
-        parts = []
-        for col in valid_cols:
-            val = row[col]
-            
-            if isinstance(val, (pd.Timestamp, datetime)):
-                val = format_date_vn(val)
-            
-            if pd.notnull(val) and str(val).strip() != "":
-                parts.append(str(val))
-        
-        display_text = f"{id_val} | " + " - ".join(parts) if parts else str(id_val)
-        
-        display_list.append(display_text)
-        mapping[display_text] = id_val
+def filter_display_list(display_list, query, limit=200, folded=None):
+    """
+    Lọc danh sách dropdown theo từ khóa (không phân biệt hoa/thường, có dấu/không dấu).
+    Luôn giữ mục đầu tiên (dòng 'Chọn...'); tối đa limit kết quả.
+    folded: danh sách đã bỏ dấu + viết thường sẵn (nếu có) để khỏi tính lại.
+    """
+    words = fold_vietnamese(query).lower().split()
+    if not words:
+        return display_list[:limit + 1] if limit else display_list
+    if folded is None:
+        folded = [fold_vietnamese(x).lower() for x in display_list]
 
-    return display_list, mapping
+    result = display_list[:1]
+    for text, key in zip(display_list[1:], folded[1:]):
+        if all(w in key for w in words):
+            result.append(text)
+            if limit and len(result) > limit:
+                break
+    return result
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import threading
+import streamlit as st
+from config import LOCAL_CACHE_DIR, WRITE_FLUSH_INTERVAL, WRITE_RETRY_MAX_DELAY, WRITE_MAX_ATTEMPTS
+
+# =========================================================
+# 📮 HÀNG ĐỢI GHI NỀN (Write-behind)
+# =========================================================
+# Mỗi lệnh ghi là 1 dict: sheet, kind, payload (+ attempts, next_try, error).
+# kind / payload (chỉ gồm giá trị JSON được để ghi nhật ký ra đĩa):
+# - "overwrite": {"columns": [...], "rows": [[...], ...]}
+# - "append":    {"records": [{cột: giá trị}, ...]}
+# - "update":    {"cells": [[id, vị_trí, cột, giá_trị], ...]}
+# - "delete":    {"rows": [[id, vị_trí], ...]}
+# (id: giá trị cột ID để định vị dòng lúc ghi, None nếu không có; vị_trí: dự phòng)
+# Lệnh lỗi quá WRITE_MAX_ATTEMPTS lần bị chuyển sang danh sách "failed" (không chặn các lệnh sau,
+# chờ người dùng bỏ hoặc thử lại). Lệnh đang gửi dở khi tiến trình dừng được đánh dấu "replayed"
+# lúc đọc lại nhật ký: hàm thực thi phải bỏ qua phần đã ghi (VD: dòng đã thêm có ID đã có trên Sheet).
+JOURNAL_PATH = os.path.join(LOCAL_CACHE_DIR, "write_journal.json")
+
+
+def _coalesce(last, kind, payload):
+    """Gộp lệnh mới vào lệnh cuối cùng đang chờ của cùng sheet. Trả về True nếu gộp được."""
+    if last["kind"] != kind:
+        return False
+    if kind == "append":
+        last["payload"]["records"].extend(payload["records"])
+        return True
+    if kind == "update":
+        cells = {(c[0], c[1], c[2]): c for c in last["payload"]["cells"]}
+        for c in payload["cells"]:
+            cells[(c[0], c[1], c[2])] = c # Ô sửa nhiều lần -> giữ giá trị sau cùng
+        last["payload"]["cells"] = list(cells.values())
+        return True
+    return False
+
+
+class WriteQueue:
+    """Hàng đợi ghi dùng chung cho cả tiến trình, có nhật ký trên đĩa và thử lại khi lỗi."""
+
+    def __init__(self, journal_path=JOURNAL_PATH):
+        self.journal_path = journal_path
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.ops, self.failed = self._load_journal()
+        self.executor = None
+        self.on_flushed = None
+        self.on_failed = None
+        self.thread = None
+        self.last_error = None
+
+    # -----------------------------------------------------
+    # Nhật ký trên đĩa (để không mất thay đổi khi App khởi động lại)
+    # -----------------------------------------------------
+    def _load_journal(self):
+        try:
+            with open(self.journal_path, encoding="utf-8") as f:
+                data = json.load(f)
+            # Nhật ký cũ chỉ là list lệnh chờ
+            ops, failed = (data, []) if isinstance(data, list) else (data.get("ops", []), data.get("failed", []))
+            for op in ops:
+                # Đang gửi dở lúc dừng -> có thể đã ghi rồi, lúc gửi lại phải bỏ phần đã có
+                op["replayed"] = op.get("replayed") or op.get("inflight", False)
+                op["inflight"] = False
+                op["next_try"] = 0
+            return ops, failed
+        except Exception:
+            return [], []
+
+    def _persist(self):
+        try:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            with open(self.journal_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"ops": self.ops, "failed": self.failed}, f, ensure_ascii=False)
+            os.replace(self.journal_path + ".tmp", self.journal_path)
+        except Exception as e:
+            print(f"Lỗi ghi nhật ký hàng đợi: {e}")
+
+    # -----------------------------------------------------
+    # API
+    # -----------------------------------------------------
+    def start(self, executor, on_flushed=None, on_failed=None):
+        """
+        Gắn hàm thực thi (sheet, kind, payload, replayed) và khởi động luồng nền nếu chưa chạy.
+        on_flushed(sheet, kind, payload, replayed): sau mỗi lệnh gửi xong; on_failed(sheet): khi 1 lệnh bị bỏ vào "failed".
+        """
+        self.executor = executor
+        self.on_flushed = on_flushed
+        self.on_failed = on_failed
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def submit(self, sheet_name, kind, payload):
+        """Ghi nhật ký 1 lệnh ghi rồi trả về ngay; luồng nền sẽ gửi đi."""
+        with self.lock:
+            last = self._last_op(sheet_name)
+            if kind == "overwrite":
+                # Ghi đè toàn bộ -> các lệnh chờ trước đó của sheet này không còn ý nghĩa
+                self.ops = [op for op in self.ops if op["sheet"] != sheet_name or op["inflight"]]
+            elif last is not None and not last["inflight"] and _coalesce(last, kind, payload):
+                self._persist()
+                return
+            self.ops.append({
+                "sheet": sheet_name, "kind": kind, "payload": payload,
+                "attempts": 0, "next_try": 0, "error": None, "inflight": False, "replayed": False,
+            })
+            self._persist()
+
+    def _last_op(self, sheet_name):
+        ops = [op for op in self.ops if op["sheet"] == sheet_name]
+        return ops[-1] if ops else None
+
+    def pending(self, sheet_name=None):
+        """Các lệnh chưa gửi xong (theo thứ tự), có thể lọc theo sheet."""
+        with self.lock:
+            return [op for op in self.ops if sheet_name is None or op["sheet"] == sheet_name]
+
+    def failed_ops(self):
+        """Các lệnh đã lỗi quá WRITE_MAX_ATTEMPTS lần (không còn tự gửi lại)."""
+        with self.lock:
+            return list(self.failed)
+
+    def discard_failed(self, index):
+        """Bỏ hẳn 1 lệnh lỗi (thay đổi đó không được ghi lên Sheet)."""
+        with self.lock:
+            if 0 <= index < len(self.failed):
+                del self.failed[index]
+                self._persist()
+
+    def retry_failed(self, index):
+        """Đưa 1 lệnh lỗi về cuối hàng đợi để gửi lại từ đầu."""
+        with self.lock:
+            if 0 <= index < len(self.failed):
+                op = self.failed.pop(index)
+                op.update(attempts=0, next_try=0, inflight=False)
+                self.ops.append(op)
+                self._persist()
+
+    def flush(self):
+        """Gửi các lệnh đến hạn; lệnh lỗi được thử lại sau (chờ tăng dần), giữ đúng thứ tự theo sheet."""
+        if self.executor is None:
+            return
+        with self.flush_lock:
+            now = time.time()
+            with self.lock:
+                sheets = list(dict.fromkeys(op["sheet"] for op in self.ops))
+
+            for sheet_name in sheets:
+                while True:
+                    with self.lock:
+                        ops = [op for op in self.ops if op["sheet"] == sheet_name]
+                        if not ops or ops[0]["next_try"] > now:
+                            break
+                        op = ops[0]
+                        op["inflight"] = True
+                        self._persist() # Dừng giữa chừng -> lần sau biết lệnh này có thể đã ghi
+                    try:
+                        self.executor(sheet_name, op["kind"], op["payload"], op.get("replayed", False))
+                    except Exception as e:
+                        with self.lock:
+                            op["inflight"] = False
+                            op["replayed"] = True # Có thể đã ghi được 1 phần trước khi lỗi
+                            op["attempts"] += 1
+                            op["next_try"] = time.time() + min(WRITE_RETRY_MAX_DELAY, 2 ** op["attempts"])
+                            op["error"] = str(e)
+                            self.last_error = f"{sheet_name}: {e}"
+                            given_up = op["attempts"] >= WRITE_MAX_ATTEMPTS
+                            if given_up:
+                                # Bỏ ra khỏi hàng đợi để không chặn các lệnh sau của sheet
+                                self.ops = [o for o in self.ops if o is not op]
+                                self.failed.append(op)
+                            self._persist()
+                        if given_up:
+                            if self.on_failed:
+                                self.on_failed(sheet_name)
+                            continue
+                        break
+                    with self.lock:
+                        self.ops = [o for o in self.ops if o is not op]
+                        if not self.ops:
+                            self.last_error = None
+                        self._persist()
+                    if self.on_flushed:
+                        self.on_flushed(sheet_name, op["kind"], op["payload"], op.get("replayed", False))
+
+    def _run(self):
+        # Chờ 1 nhịp để các lệnh ghi liên tiếp kịp gộp lại thành 1 lần gửi
+        while True:
+            time.sleep(WRITE_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                self.last_error = str(e)
+
+
+@st.cache_resource
+def get_write_queue():
+    """Hàng đợi ghi dùng chung cho mọi phiên trong tiến trình."""
+    return WriteQueue()